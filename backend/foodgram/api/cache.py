@@ -0,0 +1,106 @@
+import time
+
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+from core.routers import stick_to_primary
+from recipes.models import Recipe, Tag
+
+
+REFERENCE_CACHE = 'reference'
+RESPONSE_CACHE = 'responses'
+
+
+def get_version(namespace: str, alias: str = REFERENCE_CACHE) -> float:
+    """Получить текущую версию закэшированных данных.
+
+    Версия - время последней инвалидации. Если её нет в кэше,
+    она создаётся заново, и все старые записи становятся неактуальными.
+
+    Args:
+        namespace (str): Группа данных, например `tags`.
+        alias (str): Кэш, в котором хранятся данные группы.
+
+    Returns:
+        float: Версия данных.
+    """
+    cache = caches[alias]
+    key = f'version:{namespace}'
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time())
+        version = cache.get(key, time.time())
+    return version
+
+
+def bump_version(namespace: str, alias: str = REFERENCE_CACHE) -> None:
+    """Инвалидировать закэшированные данные группы.
+
+    Args:
+        namespace (str): Группа данных, например `tags`.
+        alias (str): Кэш, в котором хранятся данные группы.
+    """
+    caches[alias].set(f'version:{namespace}', time.time())
+
+
+def bump_reference_version(namespace: str) -> None:
+    """Инвалидировать закэшированный справочник после завершения
+    текущей транзакции, по той же причине, что и `bump_recipes_version`.
+
+    Args:
+        namespace (str): Справочник: `tags` или `ingredients`.
+    """
+    transaction.on_commit(lambda: bump_version(namespace))
+
+
+def get_user_version(user_id: int) -> float:
+    """Версия данных пользователя: избранного, корзины и подписок."""
+    return get_version(f'user:{user_id}', RESPONSE_CACHE)
+
+
+def bump_user_version(user_id: int) -> None:
+    """Инвалидировать ответы, зависящие от данных пользователя,
+    после завершения текущей транзакции."""
+    transaction.on_commit(
+        lambda: bump_version(f'user:{user_id}', RESPONSE_CACHE)
+    )
+
+
+def bump_recipes_version() -> None:
+    """Инвалидировать кэш ответов со списком и карточками рецептов
+    после завершения текущей транзакции.
+
+    До фиксации транзакции другие запросы видят старые данные
+    и могли бы снова закэшировать их под новой версией. По той же причине
+    чтение на время переходит с реплики на основную БД.
+    """
+    def bump():
+        bump_version('recipes', RESPONSE_CACHE)
+        stick_to_primary('recipes')
+
+    transaction.on_commit(bump)
+
+
+def touch_recipes(**filters) -> None:
+    """Обновить `updated_at` у рецептов, чьё представление изменилось
+    без сохранения самого рецепта."""
+    Recipe.objects.filter(**filters).update(updated_at=timezone.now())
+
+
+def get_tag_ids(slugs: list[str]) -> list[int]:
+    """Получить id тегов по слагам из закэшированной таблицы тегов.
+
+    Args:
+        slugs (list[str]): Слаги тегов.
+
+    Returns:
+        list[int]: id существующих тегов.
+    """
+    cache = caches[REFERENCE_CACHE]
+    key = f'tag_ids:{get_version("tags")}'
+    tag_ids = cache.get(key)
+    if tag_ids is None:
+        tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(key, tag_ids)
+    return [tag_ids[slug] for slug in slugs if slug in tag_ids]
@@ -1,11 +1,148 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import (
+    Case,
+    Exists,
+    F,
+    IntegerField,
+    OuterRef,
+    QuerySet,
+    Value,
+    When,
+)
+from django.db.models.functions import Cast
 from django_filters.rest_framework import FilterSet, filters
 
-from recipes.models import Ingredient
+from api.cache import get_tag_ids
+from core.config import Constans
+from recipes.models import FavoriteRecipe, Ingredient, Recipe, ShoppingCart
 
 
 class IngredientFilter(FilterSet):
-    name = filters.CharFilter(lookup_expr='istartswith')
+    name = filters.CharFilter(method='filter_name')
 
     class Meta:
         model = Ingredient
         fields = ('name',)
+
+    def filter_name(self, queryset: QuerySet, name: str,
+                    value: str) -> QuerySet:
+        """Ищет ингредиенты по вхождению строки в название.
+
+        Совпадения с начала названия идут первыми, затем остальные.
+        """
+        return (
+            queryset.filter(name__icontains=value)
+            .annotate(
+                search_rank=Case(
+                    When(name__istartswith=value, then=Value(0)),
+                    default=Value(1),
+                    output_field=IntegerField(),
+                )
+            )
+            .order_by('search_rank', 'name')
+        )
+
+
+class RecipeFilter(FilterSet):
+    """Фильтры рецептов.
+
+    Связи с тегами, избранным и корзиной проверяются через `EXISTS`,
+    поэтому запрос не размножает строки рецептов и не требует `DISTINCT`.
+    """
+    author = filters.NumberFilter(field_name='author')
+    tags = filters.CharFilter(method='filter_tags')
+    is_favorited = filters.CharFilter(method='filter_is_favorited')
+    is_in_shopping_cart = filters.CharFilter(
+        method='filter_is_in_shopping_cart'
+    )
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=(('popular', 'popular'), ('trending', 'trending')),
+        method='order_recipes',
+    )
+
+    RANK_SCALE = 10 ** 6
+
+    # Курсор страниц хранит все три поля и выбирает следующую страницу
+    # по индексам recipe_popular_idx и recipe_trending_idx: у большинства
+    # рецептов первое поле одинаковое (0), одного его для позиции мало
+    ORDERINGS = {
+        'popular': ('-favorites_count', '-pub_date', '-id'),
+        'trending': ('-trending_score', '-pub_date', '-id'),
+    }
+
+    class Meta:
+        model = Recipe
+        fields = (
+            'author',
+            'tags',
+            'is_favorited',
+            'is_in_shopping_cart',
+            'search',
+            'ordering',
+        )
+
+    def filter_tags(self, queryset: QuerySet, name: str,
+                    value: str) -> QuerySet:
+        """Оставляет рецепты хотя бы с одним из переданных тегов."""
+        tag_ids = get_tag_ids(self.data.getlist(name))
+        return queryset.filter(
+            Exists(
+                Recipe.tags.through.objects.filter(
+                    recipe=OuterRef('pk'), tag__in=tag_ids
+                )
+            )
+        )
+
+    def filter_is_favorited(self, queryset: QuerySet, name: str,
+                            value: str) -> QuerySet:
+        """Оставляет рецепты из избранного пользователя."""
+        return self.filter_user_relation(queryset, value, FavoriteRecipe)
+
+    def filter_is_in_shopping_cart(self, queryset: QuerySet, name: str,
+                                   value: str) -> QuerySet:
+        """Оставляет рецепты из корзины пользователя."""
+        return self.filter_user_relation(queryset, value, ShoppingCart)
+
+    def filter_user_relation(self, queryset: QuerySet, value: str,
+                             relation_model: type) -> QuerySet:
+        user = self.request.user
+        if value != Constans.POSITIVE_FLAG or user.is_anonymous:
+            return queryset
+        return queryset.filter(
+            Exists(
+                relation_model.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )
+            )
+        )
+
+    def filter_search(self, queryset: QuerySet, name: str,
+                      value: str) -> QuerySet:
+        """Полнотекстовый поиск по названию, ингредиентам и описанию.
+
+        Запрос разбирается как в поисковых системах: слова, фразы
+        в кавычках, `-` для исключения. Использует GIN индекс по
+        `search_vector`, результаты упорядочены по релевантности.
+        """
+        query = SearchQuery(
+            value, config=Constans.SEARCH_CONFIG, search_type='websearch'
+        )
+        # Ранг приводится к целому числу: позиция курсорной пагинации
+        # сохраняется строкой, а float4 после такого преобразования
+        # не сравнивается с самим собой точно
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=Cast(
+                SearchRank(F('search_vector'), query) * self.RANK_SCALE,
+                IntegerField(),
+            )
+        ).order_by('-search_rank', '-pub_date', '-id')
+
+    def order_recipes(self, queryset: QuerySet, name: str,
+                      value: str) -> QuerySet:
+        """Сортирует рецепты по популярности.
+
+        `popular` - по количеству добавлений в избранное, `trending` -
+        по рейтингу, который пересчитывает команда `update_trending`.
+        """
+        return queryset.order_by(*self.ORDERINGS[value])
@@ -1,14 +1,30 @@
-from django.db.models import Model, Q
+import hashlib
+from typing import Callable, Optional
+from urllib.parse import urlencode
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Model, Q, QuerySet
 from django.db.utils import IntegrityError
 from django.shortcuts import get_object_or_404
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date, quote_etag
+from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.serializers import ModelSerializer
 from rest_framework.status import (
+    HTTP_200_OK,
     HTTP_201_CREATED,
     HTTP_204_NO_CONTENT,
     HTTP_400_BAD_REQUEST,
 )
 
+from api.cache import REFERENCE_CACHE, get_user_version, get_version
+
 
 class AddOrDeleteRelationForUserViewMixin:
     """Миксин для работы со связями между пользователем и объектом"""
@@ -20,7 +36,9 @@ class AddOrDeleteRelationForUserViewMixin:
         obj = get_object_or_404(self.queryset, pk=object_id)
         entry = self.relation_model(None, self.request.user.pk, obj.pk)
         try:
-            entry.save()
+            with transaction.atomic():
+                entry.save()
+                self.relation_created(entry)
         except IntegrityError:
             return Response(
                 data={"error": "Связь уже существует"},
@@ -34,10 +52,135 @@ class AddOrDeleteRelationForUserViewMixin:
         obj = self.relation_model.objects.filter(
             params & Q(user=self.request.user)
         )
-        status, _ = obj.delete()
+        with transaction.atomic():
+            self.relation_deleted(obj)
+            status, _ = obj.delete()
         if not status:
             return Response(
                 data={"error": "Связи не существует"},
                 status=HTTP_400_BAD_REQUEST,
             )
         return Response(status=HTTP_204_NO_CONTENT)
+
+    def relation_created(self, entry: Model) -> None:
+        """Вызывается в транзакции после создания связи"""
+
+    def relation_deleted(self, entries: QuerySet) -> None:
+        """Вызывается в транзакции перед удалением связей"""
+
+
+class CachedReadOnlyViewMixin:
+    """Миксин для кэширования ответов на чтение.
+
+    Ответы `list` и `retrieve` содержат заголовки `ETag` и
+    `Last-Modified`, вычисленные по версии группы данных `cache_namespace`
+    до обращения к БД и сериализации; повторный запрос с ними получает 304.
+    Общие для всех пользователей ответы хранятся в кэше `cache_alias`
+    до изменения версии.
+
+    Если `cache_per_user` включён, ответы авторизованным пользователям
+    зависят от их избранного, корзины и подписок: в `ETag` добавляется
+    версия данных пользователя, а сами ответы не кэшируются.
+
+    Ключ строится из пути и отсортированных параметров запроса; если
+    задан `cache_query_params`, учитываются только они. При заданном
+    `cache_max_age` кэшируемые ответы помечаются как публичные для кэша
+    nginx, остальные - как приватные, с `Vary: Authorization`.
+    """
+    cache_namespace: str
+    cache_alias: str = REFERENCE_CACHE
+    cache_query_params: Optional[tuple[str, ...]] = None
+    cache_max_age: Optional[int] = None
+    cache_per_user: bool = False
+
+    def list(self, request: Request, *args, **kwargs) -> Response:
+        return self.get_cached_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request: Request, *args, **kwargs) -> Response:
+        return self.get_cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def is_personal_response(self, request: Request) -> bool:
+        """Зависит ли ответ от текущего пользователя"""
+        return self.cache_per_user and request.user.is_authenticated
+
+    def get_data_version(self, request: Request) -> float:
+        """Время последнего изменения общих для всех пользователей данных"""
+        return get_version(self.cache_namespace, self.cache_alias)
+
+    def get_cache_state(self, request: Request) -> tuple[str, float]:
+        """Состояние данных ответа.
+
+        Returns:
+            tuple[str, float]: Строка для вычисления `ETag` и время
+                последнего изменения данных.
+        """
+        version = self.get_data_version(request)
+        if not self.is_personal_response(request):
+            return str(version), version
+        user_version = get_user_version(request.user.pk)
+        return (
+            f'{version}:{request.user.pk}:{user_version}',
+            max(version, user_version),
+        )
+
+    def get_cache_params(self, request: Request) -> str:
+        """Нормализованные параметры запроса для ключа кэша.
+
+        Параметры с пустым значением сохраняются: например, `?cursor=`
+        включает курсорную пагинацию и меняет ответ.
+        """
+        params = sorted(
+            (name, sorted(values))
+            for name, values in request.query_params.lists()
+            if self.cache_query_params is None
+            or name in self.cache_query_params
+        )
+        return urlencode(
+            [(name, value) for name, values in params for value in values]
+        )
+
+    def get_cached_response(self, handler: Callable, request: Request,
+                            *args, **kwargs) -> Response:
+        """Возвращает 304, ответ из кэша или формирует и кэширует его"""
+        personal = self.is_personal_response(request)
+        state, last_modified = self.get_cache_state(request)
+        etag = quote_etag(
+            hashlib.md5(
+                f'{state}:{request.path}?{self.get_cache_params(request)}:'
+                f'{request.accepted_renderer.format}'.encode()
+            ).hexdigest()
+        )
+        last_modified = int(last_modified)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None and personal:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != HTTP_200_OK:
+                return response
+        elif response is None:
+            cache = caches[self.cache_alias]
+            key = f'response:{self.cache_namespace}:{etag}'
+            data = cache.get(key)
+            if data is None:
+                response = handler(request, *args, **kwargs)
+                if response.status_code != HTTP_200_OK:
+                    return response
+                cache.set(key, response.data)
+            else:
+                response = Response(data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        if self.cache_max_age is not None:
+            if personal:
+                patch_cache_control(response, private=True)
+            else:
+                patch_cache_control(
+                    response, public=True, max_age=self.cache_max_age
+                )
+            patch_vary_headers(response, ('Authorization',))
+        return response
@@ -1,4 +1,28 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from datetime import datetime
+from typing import Optional
+
+from django.core.exceptions import (
+    FieldDoesNotExist,
+    ImproperlyConfigured,
+    ValidationError,
+)
+from django.db.models import (
+    BooleanField,
+    F,
+    Field,
+    Func,
+    Model,
+    QuerySet,
+    Value,
+)
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    BasePagination,
+    Cursor,
+    CursorPagination,
+    PageNumberPagination,
+)
 
 from core.config import Constans
 
@@ -9,3 +33,194 @@ class PageLimitPagination(PageNumberPagination):
     """
     page_size = Constans.PAGE_SIZE
     page_size_query_param = "limit"
+
+
+class RowComparison(Func):
+    """Сравнение строк `(a, b) < (x, y)`.
+
+    В отличие от условия, раскрытого через `OR`, PostgreSQL ищет по нему
+    в составном индексе с тем же порядком полей.
+    """
+    output_field = BooleanField()
+
+    def __init__(self, fields: list, values: list, operator: str):
+        self.operator = operator
+        super().__init__(*fields, *values)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql, params = [], []
+        for expression in self.get_source_expressions():
+            expression_sql, expression_params = compiler.compile(expression)
+            sql.append(expression_sql)
+            params.extend(expression_params)
+        size = len(sql) // 2
+        return (
+            f'({", ".join(sql[:size])}) {self.operator} '
+            f'({", ".join(sql[size:])})',
+            params,
+        )
+
+
+def get_ordering_field(queryset: QuerySet, name: str) -> Field:
+    """Поле модели или аннотации queryset, по которому идёт сортировка."""
+    if name in queryset.query.annotations:
+        return queryset.query.annotations[name].output_field
+    if name == 'pk':
+        return queryset.model._meta.pk
+    return queryset.model._meta.get_field(name)
+
+
+class LimitCursorPagination(CursorPagination):
+    """Курсорный пагинатор по ключу (keyset).
+
+    Курсор хранит значения всех полей сортировки крайней строки
+    страницы, следующая выбирается условием `(pub_date, id) < (...)`
+    по составному индексу, а не через `OFFSET`: глубокие страницы
+    не дороже первой, а строки с одинаковым первым полем сортировки
+    не пропускаются и не повторяются.
+
+    Сортировка берётся из queryset (`order_by` или `Meta.ordering`)
+    и дополняется `pk`, если он не последний. Все поля сортируются
+    в одном направлении.
+    """
+    page_size = Constans.PAGE_SIZE
+    page_size_query_param = "limit"
+
+    def get_ordering(self, request, queryset, view) -> tuple[str, ...]:
+        ordering = list(
+            queryset.query.order_by
+            or queryset.model._meta.ordering
+            or ('-pk',)
+        )
+        if (
+            not all(isinstance(field, str) for field in ordering)
+            or len({field.startswith('-') for field in ordering}) > 1
+        ):
+            raise ImproperlyConfigured(
+                'Курсорная пагинация поддерживает сортировку по полям '
+                'в одном направлении'
+            )
+        descending = ordering[0].startswith('-')
+        pk_names = ('pk', queryset.model._meta.pk.name)
+        if ordering[-1].lstrip('-') not in pk_names:
+            ordering.append('-pk' if descending else 'pk')
+        return tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        position = self.decode_position(queryset, self.cursor)
+
+        names = [field.lstrip('-') for field in self.ordering]
+        descending = self.ordering[0].startswith('-')
+        if descending == reverse:
+            queryset = queryset.order_by(*names)
+        else:
+            queryset = queryset.order_by(*(f'-{name}' for name in names))
+        if position is not None:
+            queryset = queryset.filter(
+                RowComparison(
+                    [F(name) for name in names],
+                    position,
+                    '<' if descending != reverse else '>',
+                )
+            )
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_next_link(self) -> Optional[str]:
+        if not self.has_next:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=False, position=self.get_position(-1))
+        )
+
+    def get_previous_link(self) -> Optional[str]:
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=True, position=self.get_position(0))
+        )
+
+    def get_position(self, index: int) -> str:
+        """Позиция строки страницы с индексом `index` для курсора.
+
+        Для пустой страницы, например после удаления строк, - позиция
+        из текущего курсора.
+        """
+        if not self.page:
+            return self.cursor.position
+        return encode_position(self.page[index], self.ordering)
+
+    def decode_position(self, queryset: QuerySet,
+                        cursor: Optional[Cursor]) -> Optional[list[Value]]:
+        """Значения полей сортировки из курсора.
+
+        Raises:
+            NotFound: Курсор повреждён или создан для другой сортировки.
+        """
+        if cursor is None or cursor.position is None:
+            return None
+        try:
+            values = json.loads(cursor.position)
+            if (
+                not isinstance(values, list)
+                or len(values) != len(self.ordering)
+            ):
+                raise ValueError
+            position = []
+            for field, value in zip(self.ordering, values):
+                output_field = get_ordering_field(queryset, field.lstrip('-'))
+                position.append(
+                    Value(output_field.to_python(value), output_field)
+                )
+        except (FieldDoesNotExist, TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+
+def encode_position(instance: Model, ordering: tuple[str, ...]) -> str:
+    """Значения полей сортировки строки в JSON для курсора."""
+    values = []
+    for field in ordering:
+        value = getattr(instance, field.lstrip('-'))
+        values.append(
+            value.isoformat() if isinstance(value, datetime) else value
+        )
+    return json.dumps(values, separators=(',', ':'))
+
+
+class PageOrCursorPagination(BasePagination):
+    """Постраничный пагинатор с курсорным режимом по запросу.
+
+    Курсорный режим включается параметром `cursor`, для первой
+    страницы его можно передать пустым: `?cursor=`.
+    """
+    cursor_query_param = "cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param in request.query_params:
+            self.paginator = LimitCursorPagination()
+        else:
+            self.paginator = PageLimitPagination()
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
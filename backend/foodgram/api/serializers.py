@@ -1,14 +1,23 @@
 from collections import OrderedDict
-import base64
+from typing import Optional
+import json
 
 from rest_framework import serializers
-from django.db.models import F, QuerySet
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from django.core.exceptions import ValidationError
-from django.core.files.base import ContentFile
 from django.contrib.auth import get_user_model
-
+from django.http import QueryDict
+
+from core.config import Constans
+from recipes.images import (
+    check_image,
+    decode_base64_image,
+    get_variant_urls,
+)
 from recipes.models import Tag, Ingredient, Recipe, RecipeIngredients
 from users.models import Follow
+from .utils import set_recipe_ingredients, update_shopping_cart_totals
 
 
 User = get_user_model()
@@ -67,6 +76,9 @@ class UserSerializer(serializers.ModelSerializer):
         Returns:
             bool: True - подписка есть, False - нет.
         """
+        subscriptions = self.context.get('subscriptions')
+        if subscriptions is not None:
+            return author.pk in subscriptions
         if (self.context.get('request')
            and not self.context['request'].user.is_anonymous):
             return Follow.objects.filter(
@@ -77,12 +89,13 @@ class UserSerializer(serializers.ModelSerializer):
 
 
 class Base64ImageField(serializers.ImageField):
+    """Изображение в виде data URI в base64 или файла из
+    `multipart/form-data` запроса."""
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = decode_base64_image(data)
+        elif hasattr(data, 'chunks'):
+            check_image(data)
 
         return super().to_internal_value(data)
 
@@ -96,22 +109,36 @@ class RecipeSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
-    def get_ingredients(self, recipe: Recipe) -> QuerySet[dict]:
+    def get_ingredients(self, recipe: Recipe) -> list[dict]:
         """Получает список ингридиентов для рецепта.
 
+        Читает связи `recipe.ingredient`, поэтому при предзагрузке
+        в `RecipeViewSet.get_queryset` не выполняет запросов.
+
         Args:
             recipe (Recipe): Рецепт.
 
         Returns:
-            QuerySet[dict]: Список ингридиентов и их количество в рецепте.
+            list[dict]: Список ингридиентов и их количество в рецепте.
         """
-        ingredients = recipe.ingredients.values(
-            'id', 'name', 'measurement_unit', amount=F('recipe__amount')
-        )
+        ingredients = []
+        for recipe_ingredient in recipe.ingredient.all():
+            ingredient = recipe_ingredient.ingredient
+            ingredients.append(
+                {
+                    'id': ingredient.id,
+                    'name': ingredient.name,
+                    'measurement_unit': ingredient.measurement_unit,
+                    'amount': recipe_ingredient.amount,
+                }
+            )
         return ingredients
 
     def get_is_favorited(self, recipe: Recipe) -> bool:
-        """Получает флаг избранного рецепта
+        """Получает флаг избранного рецепта.
+
+        Использует аннотацию `is_favorited` из `RecipeViewSet.get_queryset`,
+        если она есть, иначе выполняет отдельный запрос.
 
         Args:
             recipe (Recipe): Рецепт.
@@ -119,6 +146,8 @@ class RecipeSerializer(serializers.ModelSerializer):
         Returns:
             (bool): True - избранный, False - нет
         """
+        if hasattr(recipe, 'is_favorited'):
+            return recipe.is_favorited
         user = self.context.get('view').request.user
 
         if user.is_anonymous:
@@ -126,7 +155,11 @@ class RecipeSerializer(serializers.ModelSerializer):
         return user.favorites.filter(recipe=recipe).exists()
 
     def get_is_in_shopping_cart(self, recipe: Recipe) -> bool:
-        """Получает флаг рецепта в списке покупок
+        """Получает флаг рецепта в списке покупок.
+
+        Использует аннотацию `is_in_shopping_cart` из
+        `RecipeViewSet.get_queryset`, если она есть, иначе выполняет
+        отдельный запрос.
 
         Args:
             recipe (Recipe): Рецепт.
@@ -134,6 +167,8 @@ class RecipeSerializer(serializers.ModelSerializer):
         Returns:
             (bool): True - в списке покупок, False - нет
         """
+        if hasattr(recipe, 'is_in_shopping_cart'):
+            return recipe.is_in_shopping_cart
         user = self.context.get('view').request.user
 
         if user.is_anonymous:
@@ -156,52 +191,85 @@ class RecipeSerializer(serializers.ModelSerializer):
         ingredients: list[dict[str, int]] = self.initial_data.get(
             'ingredients'
         )
+        if isinstance(self.initial_data, QueryDict):
+            # multipart/form-data: теги передаются несколькими полями,
+            # ингредиенты - строкой JSON
+            tags = self.initial_data.getlist('tags')
+            try:
+                ingredients = json.loads(ingredients or '[]')
+            except ValueError:
+                raise ValidationError('Ингредиенты должны быть списком JSON')
 
         if not tags or not ingredients:
             raise ValidationError('Отсутствуют теги и/или ингредиенты')
 
-        existing_tags = Tag.objects.filter(id__in=tags)
-        if len(tags) != len(existing_tags):
+        try:
+            tag_ids = {int(tag) for tag in tags}
+            amounts = {
+                int(ing['id']): int(ing['amount']) for ing in ingredients
+            }
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError('Некорректные теги и/или ингредиенты')
+
+        if tag_ids - set(
+            Tag.objects.filter(pk__in=tag_ids).values_list('pk', flat=True)
+        ):
             raise ValidationError('Такой тег не существует')
 
-        ingredients_tmp = {}
-        for ing in ingredients:
-            if int(ing['amount']) < 1:
-                raise ValidationError(
-                    'Кол-во ингредиента не может быть меньше 1'
-                )
-            ingredients_tmp[ing['id']] = int(ing['amount'])
-        existing_ingredients = Ingredient.objects.filter(
-            id__in=ingredients_tmp.keys()
-        )
-        if len(ingredients_tmp) != len(existing_ingredients):
+        if min(amounts.values()) < 1:
+            raise ValidationError(
+                'Кол-во ингредиента не может быть меньше 1'
+            )
+        if amounts.keys() - set(
+            Ingredient.objects.filter(pk__in=amounts).values_list(
+                'pk', flat=True
+            )
+        ):
             raise ValidationError('Такого ингредиента не существует')
-        for ing in existing_ingredients:
-            ingredients_tmp[ing.pk] = (ing, ingredients_tmp[ing.pk])
         data.update(
             {
-                'tags': existing_tags,
-                'ingredients': ingredients_tmp,
+                'tags': tag_ids,
+                'ingredients': amounts,
             }
         )
         return data
 
+    @transaction.atomic
     def create(self, validated_data: dict) -> Recipe:
         """Создание рецепта."""
         ingredients_data = validated_data.pop('ingredients')
         tags_data = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
-        recipe.tags.set(tags_data)
+        Recipe.tags.through.objects.bulk_create(
+            [
+                Recipe.tags.through(recipe=recipe, tag_id=tag_id)
+                for tag_id in tags_data
+            ]
+        )
         RecipeIngredients.objects.bulk_create(
             [
                 RecipeIngredients(
-                    recipe=recipe, ingredient=ingredient, amount=amount
+                    recipe=recipe, ingredient_id=ingredient_id, amount=amount
                 )
-                for ingredient, amount in ingredients_data.values()
+                for ingredient_id, amount in ingredients_data.items()
             ]
         )
+        # Данные для ответа: связи читаются двумя запросами,
+        # новый рецепт ещё не может быть в избранном или корзине
+        prefetch_related_objects(
+            [recipe],
+            'tags',
+            Prefetch(
+                'ingredient',
+                queryset=RecipeIngredients.objects.select_related(
+                    'ingredient'
+                ),
+            ),
+        )
+        recipe.is_favorited = recipe.is_in_shopping_cart = False
         return recipe
 
+    @transaction.atomic
     def update(self, instance: Recipe, validated_data: dict) -> Recipe:
         """Обновление рецепта."""
         ingredients_data = validated_data.pop('ingredients')
@@ -214,15 +282,17 @@ class RecipeSerializer(serializers.ModelSerializer):
             instance.tags.set(tags_data)
 
         if ingredients_data:
-            instance.ingredients.clear()
-            RecipeIngredients.objects.bulk_create(
-                [
-                    RecipeIngredients(
-                        recipe=instance, ingredient=ingredient, amount=amount
-                    )
-                    for ingredient, amount in ingredients_data.values()
-                ]
-            )
+            deltas = set_recipe_ingredients(instance, ingredients_data)
+            if deltas:
+                update_shopping_cart_totals(
+                    {
+                        (user_id, ingredient_id): delta
+                        for user_id in instance.in_carts.values_list(
+                            'user', flat=True
+                        )
+                        for ingredient_id, delta in deltas.items()
+                    }
+                )
 
         instance.save()
         return instance
@@ -241,12 +311,47 @@ class RecipeReadSerializer(RecipeSerializer):
         'get_image_url',
         read_only=True,
     )
+    images = serializers.SerializerMethodField()
 
     def get_image_url(self, obj):
         if obj.image:
             return obj.image.url
         return None
 
+    def get_images(self, obj: Recipe) -> Optional[dict]:
+        """Ссылки на уменьшенные копии изображения в JPEG и WebP."""
+        return get_variant_urls(obj.image)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('images',)
+
+
+class CookRecipeSerializer(RecipeReadSerializer):
+    """Рецепт в поиске по имеющимся ингредиентам.
+
+    `coverage` - доля ингредиентов рецепта, которые есть у пользователя,
+    `missing` - сколько ингредиентов не хватает.
+    """
+    coverage = serializers.FloatField(read_only=True)
+    missing = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeReadSerializer.Meta):
+        fields = RecipeReadSerializer.Meta.fields + ('coverage', 'missing')
+
+
+class CookQuerySerializer(serializers.Serializer):
+    """Параметры поиска рецептов по имеющимся ингредиентам."""
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        min_length=1,
+        max_length=Constans.COOK_MAX_INGREDIENTS,
+    )
+    limit = serializers.IntegerField(
+        min_value=1,
+        max_value=Constans.COOK_RESULTS_LIMIT,
+        default=Constans.COOK_RESULTS_LIMIT,
+    )
+
 
 class ReadRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор модели Recipe для сериалайзера модели Follow."""
@@ -255,14 +360,20 @@ class ReadRecipeSerializer(serializers.ModelSerializer):
         read_only=True,
     )
 
+    images = serializers.SerializerMethodField()
+
     def get_image_url(self, obj):
         if obj.image:
             return obj.image.url
         return None
 
+    def get_images(self, obj: Recipe) -> Optional[dict]:
+        """Ссылки на уменьшенные копии изображения в JPEG и WebP."""
+        return get_variant_urls(obj.image)
+
     class Meta:
         model = Recipe
-        fields = 'id', 'name', 'image', 'cooking_time'
+        fields = 'id', 'name', 'image', 'images', 'cooking_time'
         read_only_fields = ('__all__',)
 
 
@@ -270,7 +381,7 @@ class FollowSerializer(UserSerializer):
     """Сериализатор подписок"""
 
     recipes = ReadRecipeSerializer(many=True, read_only=True)
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(read_only=True)
     is_subscribed = serializers.BooleanField(True)
 
     class Meta:
@@ -286,14 +397,3 @@ class FollowSerializer(UserSerializer):
             "recipes_count",
         )
         read_only_fields = ("__all__",)
-
-    def get_recipes_count(self, author: User) -> int:
-        """Получить кол-во рецептов автора.
-
-        Args:
-            obj (User): Автор.
-
-        Returns:
-            int: Количество рецептов автора.
-        """
-        return author.recipes.count()
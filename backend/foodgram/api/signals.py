@@ -0,0 +1,151 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from api.cache import (
+    bump_recipes_version,
+    bump_reference_version,
+    bump_user_version,
+    touch_recipes,
+)
+from api.utils import (
+    get_cart_deltas,
+    get_recipe_ingredient_deltas,
+    update_shopping_cart_totals,
+)
+from recipes.models import (
+    FavoriteRecipe,
+    Ingredient,
+    Recipe,
+    RecipeIngredients,
+    ShoppingCart,
+    Tag,
+)
+from users.models import Follow
+
+
+User = get_user_model()
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags(**kwargs):
+    bump_reference_version('tags')
+    bump_recipes_version()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredients(**kwargs):
+    bump_reference_version('ingredients')
+    bump_recipes_version()
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipes(**kwargs):
+    bump_recipes_version()
+
+
+@receiver(pre_save, sender=RecipeIngredients)
+def remember_recipe_ingredient(instance, **kwargs):
+    """Запомнить строку до изменения: в админке её можно перенести
+    в другой рецепт."""
+    instance.previous = None
+    if instance.pk is not None:
+        instance.previous = RecipeIngredients.objects.filter(
+            pk=instance.pk
+        ).values_list('recipe', 'ingredient', 'amount').first()
+
+
+# Только post_save: обработчик post_delete отключил бы быстрое удаление
+# строк в set_recipe_ingredients. Удаление в инлайне RecipeAdmin
+# сопровождается сохранением рецепта, а RecipeIngredientAdmin удаляет
+# строки через delete_recipe_ingredients.
+@receiver(post_save, sender=RecipeIngredients)
+def invalidate_recipe_ingredients(instance, **kwargs):
+    recipe_ids = {instance.recipe_id}
+    if getattr(instance, 'previous', None) is not None:
+        recipe_ids.add(instance.previous[0])
+    touch_recipes(pk__in=recipe_ids)
+    bump_recipes_version()
+
+
+@receiver(post_save, sender=RecipeIngredients)
+def update_carts_for_recipe_ingredient(instance, **kwargs):
+    """Пересчитать корзины при изменении ингредиента рецепта вне API
+    (в API состав меняется пакетно, без сигналов)."""
+    rows = [(instance.recipe_id, instance.ingredient_id, instance.amount)]
+    deltas = get_recipe_ingredient_deltas(rows)
+    if getattr(instance, 'previous', None) is not None:
+        for key, delta in get_recipe_ingredient_deltas(
+            [instance.previous], sign=-1
+        ).items():
+            deltas[key] += delta
+    update_shopping_cart_totals(deltas)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(instance, action, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if isinstance(instance, Recipe):
+        touch_recipes(pk=instance.pk)
+    elif pk_set:
+        touch_recipes(pk__in=pk_set)
+    bump_recipes_version()
+
+
+@receiver((post_save, post_delete), sender=User)
+def invalidate_authors(instance, update_fields=None, **kwargs):
+    # Вход пользователя меняет только last_login, его нет в ответах
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    touch_recipes(author=instance)
+    bump_recipes_version()
+
+
+@receiver(pre_save, sender=ShoppingCart)
+def remember_cart(instance, **kwargs):
+    instance.previous = None
+    if instance.pk is not None:
+        instance.previous = ShoppingCart.objects.filter(
+            pk=instance.pk
+        ).values_list('user', 'recipe').first()
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_cart_totals(instance, **kwargs):
+    """Добавить ингредиенты рецепта к корзине пользователя.
+
+    Суммарные количества поддерживаются обработчиками модели, поэтому
+    корзина согласована и при изменении через админку.
+    """
+    current = (instance.user_id, instance.recipe_id)
+    previous = getattr(instance, 'previous', None)
+    if previous == current:
+        return
+    deltas = get_cart_deltas([current])
+    if previous is not None:
+        for key, delta in get_cart_deltas([previous], sign=-1).items():
+            deltas[key] += delta
+    update_shopping_cart_totals(deltas)
+
+
+# pre_delete, а не post_delete: при каскадном удалении рецепта его
+# ингредиенты удаляются раньше, чем отправляется post_delete корзин
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_cart_totals(instance, **kwargs):
+    update_shopping_cart_totals(
+        get_cart_deltas([(instance.user_id, instance.recipe_id)], sign=-1)
+    )
+
+
+@receiver((post_save, post_delete), sender=FavoriteRecipe)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+@receiver((post_save, post_delete), sender=Follow)
+def invalidate_user_data(instance, **kwargs):
+    bump_user_version(instance.user_id)
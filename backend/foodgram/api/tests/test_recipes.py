@@ -0,0 +1,243 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.cache import get_tag_ids, get_version
+
+from recipes.models import (
+    Ingredient,
+    Recipe,
+    RecipeIngredients,
+    ShoppingCart,
+    Tag,
+)
+
+
+User = get_user_model()
+
+
+class RecipeQueriesTest(TestCase):
+    """Запросы к БД в эндпоинтах рецептов: их количество и планы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Автор', last_name='Рецептов', password='password',
+        )
+        cls.user = User.objects.create_user(
+            username='user', email='user@example.com',
+            first_name='Читатель', last_name='Рецептов', password='password',
+        )
+        cls.tags = [
+            Tag.objects.create(name=f'Тег {i}', color=f'#00000{i}',
+                               slug=f'tag{i}')
+            for i in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {i}',
+                                      measurement_unit='г')
+            for i in range(4)
+        ]
+        cls.recipes = []
+        for i in range(6):
+            recipe = Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {i}', text='Описание',
+                cooking_time=10, image='recipes/test.png',
+            )
+            recipe.tags.set(cls.tags[:1 + i % 3])
+            RecipeIngredients.objects.bulk_create(
+                RecipeIngredients(recipe=recipe, ingredient=ingredient,
+                                  amount=10 * (j + 1))
+                for j, ingredient in enumerate(cls.ingredients[:1 + i % 4])
+            )
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        # Ответы и версии данных кэшируются между запросами
+        for alias in ('reference', 'responses'):
+            caches[alias].clear()
+        self.anonymous_client = APIClient()
+        self.authorized_client = APIClient()
+        self.authorized_client.force_authenticate(self.user)
+
+    def test_recipe_list_queries_do_not_depend_on_page_size(self):
+        """Список рецептов: подсчёт, рецепты с авторами, теги,
+        ингредиенты и для авторизованного - его подписки."""
+        clients = (
+            ('anonymous', self.anonymous_client, 4),
+            ('authorized', self.authorized_client, 5),
+        )
+        for name, client, queries in clients:
+            for limit in (2, 6):
+                with self.subTest(client=name, limit=limit):
+                    caches['responses'].clear()
+                    with self.assertNumQueries(queries):
+                        response = client.get(
+                            reverse('recipes-list'), {'limit': limit}
+                        )
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(len(response.json()['results']), limit)
+
+    def test_recipe_update_changes_only_modified_ingredient(self):
+        """Изменение количества одного ингредиента - один UPDATE строки
+        состава без удаления и повторной вставки остальных."""
+        recipe = self.recipes[3]
+        client = APIClient()
+        client.force_authenticate(self.author)
+        ingredients = [
+            {'id': row.ingredient_id, 'amount': row.amount}
+            for row in recipe.ingredient.order_by('ingredient_id')
+        ]
+        ingredients[0]['amount'] += 5
+        with CaptureQueriesContext(connection) as context:
+            response = client.patch(
+                reverse('recipes-detail', args=(recipe.pk,)),
+                {
+                    'tags': [tag.pk for tag in recipe.tags.all()],
+                    'ingredients': ingredients,
+                },
+                format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+        statements = [
+            query['sql'].split(None, 1)[0].upper()
+            for query in context.captured_queries
+            if '"recipes_recipeingredients"' in query['sql']
+        ]
+        self.assertEqual(statements.count('UPDATE'), 1)
+        self.assertNotIn('DELETE', statements)
+        self.assertNotIn('INSERT', statements)
+        self.assertEqual(
+            recipe.ingredient.get(
+                ingredient_id=ingredients[0]['id']
+            ).amount,
+            ingredients[0]['amount'],
+        )
+
+    def explain(self, captured_queries: list[dict], table: str) -> str:
+        """План первого перехваченного SELECT, читающего `table`,
+        кроме подсчёта строк для пагинации."""
+        sql = next(
+            query['sql'] for query in captured_queries
+            if query['sql'].startswith('SELECT')
+            and not query['sql'].startswith('SELECT COUNT(*)')
+            and f'"{table}"' in query['sql']
+        )
+        with connection.cursor() as cursor:
+            # На нескольких строках последовательное чтение дешевле
+            # любого индекса, план с ним ничего бы не проверил
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN {sql}')
+            return '\n'.join(row[0] for row in cursor.fetchall())
+
+    def test_shopping_cart_queries_use_unique_indexes(self):
+        """Признак `is_in_shopping_cart` в списке рецептов и удаление
+        из корзины читают корзину по уникальному индексу, а состав
+        рецепта для пересчёта корзины - по уникальному индексу."""
+        recipe = self.recipes[3]
+        ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        with CaptureQueriesContext(connection) as context:
+            response = self.authorized_client.get(reverse('recipes-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            '"unique shopping cart"',
+            self.explain(context.captured_queries, 'recipes_shoppingcart'),
+        )
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.authorized_client.delete(
+                reverse('recipes-shopping-cart', args=(recipe.pk,))
+            )
+        self.assertEqual(response.status_code, 204)
+        self.assertIn(
+            '"unique shopping cart"',
+            self.explain(context.captured_queries, 'recipes_shoppingcart'),
+        )
+        self.assertIn(
+            '"unique recipe ingredient"',
+            self.explain(
+                context.captured_queries, 'recipes_recipeingredients'
+            ),
+        )
+
+    def test_empty_cursor_is_not_served_from_page_number_cache(self):
+        """`?cursor=` включает курсорную пагинацию: ответ и `ETag`
+        не совпадают с закэшированной постраничной выдачей."""
+        url = reverse('recipes-list')
+        pages = self.anonymous_client.get(url)
+        cursor = self.anonymous_client.get(url, {'cursor': ''})
+        self.assertEqual(cursor.status_code, 200)
+        self.assertIn('count', pages.json())
+        self.assertNotIn('count', cursor.json())
+        self.assertNotEqual(pages['ETag'], cursor['ETag'])
+
+    def test_recipe_detail_with_invalid_id_is_not_found(self):
+        """Нечисловой id рецепта - 404, а не ошибка сервера."""
+        response = self.anonymous_client.get(
+            reverse('recipes-detail', args=('abc',))
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def walk_cursor(self, params: dict) -> list[int]:
+        """id рецептов со всех страниц курсорной выдачи по 2 рецепта.
+
+        Проверяет, что страницы выбираются по ключу, без `OFFSET`.
+        """
+        ids = []
+        url, params = reverse('recipes-list'), {**params, 'cursor': ''}
+        while url:
+            with CaptureQueriesContext(connection) as context:
+                response = self.anonymous_client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            for query in context.captured_queries:
+                self.assertNotIn('OFFSET', query['sql'])
+            ids += [recipe['id'] for recipe in response.json()['results']]
+            url, params = response.json()['next'], {}
+        return ids
+
+    def test_cursor_pages_through_equal_publication_dates(self):
+        """Рецепты с одинаковой датой публикации разделяются по id
+        в самом курсоре и не теряются между страницами."""
+        Recipe.objects.update(pub_date=timezone.now())
+        self.assertEqual(
+            self.walk_cursor({'limit': 2}),
+            sorted((recipe.pk for recipe in self.recipes), reverse=True),
+        )
+
+    def test_cursor_pages_through_equal_scores(self):
+        """Сортировки `popular` и `trending` листаются курсором и тогда,
+        когда у большинства рецептов нет добавлений в избранное
+        и рейтинга."""
+        leader = self.recipes[2]
+        Recipe.objects.filter(pk=leader.pk).update(
+            favorites_count=3, trending_score=0.123456789
+        )
+        others = sorted(
+            (recipe.pk for recipe in self.recipes if recipe != leader),
+            reverse=True,
+        )
+        for ordering in ('popular', 'trending'):
+            with self.subTest(ordering=ordering):
+                self.assertEqual(
+                    self.walk_cursor({'limit': 2, 'ordering': ordering}),
+                    [leader.pk] + others,
+                )
+
+    def test_tag_change_invalidates_cache_after_commit(self):
+        """Версия тегов меняется только после фиксации транзакции: иначе
+        параллельный запрос закэшировал бы старые теги под новой
+        версией."""
+        version = get_version('tags')
+        tag = self.tags[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.slug = 'renamed'
+            tag.save()
+            self.assertEqual(get_version('tags'), version)
+        self.assertNotEqual(get_version('tags'), version)
+        self.assertEqual(get_tag_ids(['renamed']), [tag.pk])
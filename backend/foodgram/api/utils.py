@@ -1,35 +1,316 @@
+import csv
+import json
+from collections import defaultdict
+from typing import Iterable, Iterator
+
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
+from django.db import connection, transaction
+from django.db.models import F, FloatField, Func, IntegerField, QuerySet
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast, Greatest
 
-from recipes.models import Ingredient
+from api.cache import bump_recipes_version, touch_recipes
+from recipes.models import (
+    Recipe,
+    RecipeIngredients,
+    ShoppingCart,
+    ShoppingCartIngredient,
+)
 
 
 User = get_user_model()
 
+CART_TOTALS_BATCH_SIZE = 1000
+
+
+class Echo:
+    """Псевдо-файл для `csv.writer`, возвращающий записанную строку."""
+
+    def write(self, value: str) -> str:
+        return value
 
-def get_shoping_cart(user: User) -> str:
-    """Получить список покупок.
+
+def get_shopping_cart_ingredients(user: User) -> QuerySet[dict]:
+    """Получить ингредиенты из списка покупок.
 
     Args:
         user (User):
             Пользователь, для которого получаем список покупок.
 
     Returns:
-        str:
-            Список продуктов.
-    """
-    shopping_list = ['Ваш список покупок: \n']
-    ingredients = (
-        Ingredient.objects.filter(recipe__recipe__in_carts__user=user)
-        .values('name', 'measurement_unit')
-        .annotate(amount=Sum('recipe__amount'))
+        QuerySet[dict]:
+            Название, единица измерения и суммарное количество
+            каждого ингредиента.
+    """
+    return (
+        ShoppingCartIngredient.objects.filter(user=user)
+        .values(
+            'amount',
+            name=F('ingredient__name'),
+            measurement_unit=F('ingredient__measurement_unit'),
+        )
+        .order_by('ingredient__name', 'ingredient__measurement_unit')
+    )
+
+
+def change_counter(queryset: QuerySet, field: str, delta: int) -> None:
+    """Атомарно изменить счётчик у объектов, не опуская его ниже нуля.
+
+    Args:
+        queryset (QuerySet): Объекты, у которых меняется счётчик.
+        field (str): Поле счётчика.
+        delta (int): Изменение.
+    """
+    queryset.update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def rank_by_coverage(
+    queryset: QuerySet[Recipe], ingredient_ids: list[int]
+) -> QuerySet[Recipe]:
+    """Отобрать рецепты, в которых есть хотя бы один из ингредиентов,
+    и упорядочить их по доле имеющихся ингредиентов.
+
+    Отбор идёт по GIN-индексу на `Recipe.ingredient_ids`, доля
+    считается только для отобранных рецептов.
+
+    Args:
+        queryset (QuerySet[Recipe]): Рецепты.
+        ingredient_ids (list[int]): id имеющихся ингредиентов.
+
+    Returns:
+        QuerySet[Recipe]: Рецепты с полями `coverage` и `missing`,
+            сначала с наибольшей долей и наименьшим числом недостающих.
+    """
+    matched = RawSQL(
+        'SELECT count(*) FROM unnest("recipes_recipe"."ingredient_ids") '
+        'AS ingredient_id WHERE ingredient_id = ANY(%s)',
+        (ingredient_ids,),
+        output_field=IntegerField(),
     )
-    ingredients_list = (
-        f'{ingredient["name"]} ({ingredient["measurement_unit"]}) '
-        f'- {ingredient["amount"]}'
-        for ingredient in ingredients
+    total = Func(
+        F('ingredient_ids'),
+        function='cardinality',
+        output_field=IntegerField(),
     )
-    shopping_list.extend(ingredients_list)
-    shopping_list.append('\nПриятных покупок!')
-    shopping_list.append('Ваш Foodgram.')
-    return "\n".join(shopping_list)
+    return (
+        queryset.filter(ingredient_ids__overlap=ingredient_ids)
+        .annotate(matched=matched, total=total)
+        .annotate(
+            coverage=Cast(F('matched'), FloatField()) / F('total'),
+            missing=F('total') - F('matched'),
+        )
+        .order_by('-coverage', 'missing', '-pub_date', '-id')
+    )
+
+
+def set_recipe_ingredients(
+    recipe: Recipe, amounts: dict[int, int]
+) -> dict[int, int]:
+    """Привести состав рецепта к новому, изменяя только отличающиеся строки.
+
+    Новые ингредиенты добавляются одним `bulk_create`, изменённые
+    количества сохраняются одним `bulk_update`, лишние строки удаляются
+    одним запросом. Используются предзагруженные `recipe.ingredient`,
+    если они есть.
+
+    Args:
+        recipe (Recipe): Рецепт.
+        amounts (dict[int, int]): Новое количество по id ингредиента.
+
+    Returns:
+        dict[int, int]: Изменение количества по id ингредиента,
+            только ненулевые.
+    """
+    rows, removed = {}, []
+    old_amounts = defaultdict(int)
+    for row in recipe.ingredient.all():
+        old_amounts[row.ingredient_id] += row.amount
+        if row.ingredient_id in rows or row.ingredient_id not in amounts:
+            removed.append(row.pk)
+        else:
+            rows[row.ingredient_id] = row
+    changed, created = [], []
+    for ingredient_id, amount in amounts.items():
+        row = rows.get(ingredient_id)
+        if row is None:
+            created.append(
+                RecipeIngredients(
+                    recipe=recipe, ingredient_id=ingredient_id, amount=amount
+                )
+            )
+        elif row.amount != amount:
+            row.amount = amount
+            changed.append(row)
+    if removed:
+        RecipeIngredients.objects.filter(pk__in=removed).delete()
+    RecipeIngredients.objects.bulk_update(changed, ('amount',))
+    RecipeIngredients.objects.bulk_create(created)
+    deltas = {}
+    for ingredient_id in old_amounts.keys() | amounts.keys():
+        delta = amounts.get(ingredient_id, 0) - old_amounts[ingredient_id]
+        if delta:
+            deltas[ingredient_id] = delta
+    return deltas
+
+
+def delete_recipe_ingredients(queryset: QuerySet) -> None:
+    """Удалить ингредиенты рецептов не через `set_recipe_ingredients`,
+    например в админке.
+
+    У `RecipeIngredients` нет обработчика `post_delete`, поэтому
+    корзины, рецепты и кэш ответов обновляются здесь.
+
+    Args:
+        queryset (QuerySet): Удаляемые строки `RecipeIngredients`.
+    """
+    with transaction.atomic():
+        rows = list(queryset.values_list('recipe', 'ingredient', 'amount'))
+        update_shopping_cart_totals(
+            get_recipe_ingredient_deltas(rows, sign=-1)
+        )
+        queryset.delete()
+        touch_recipes(pk__in={recipe_id for recipe_id, _, _ in rows})
+        bump_recipes_version()
+
+
+def get_recipe_ingredient_deltas(
+    rows: Iterable[tuple[int, int, int]], sign: int = 1
+) -> dict[tuple[int, int], int]:
+    """Получить изменения корзин при добавлении или удалении
+    ингредиентов рецептов.
+
+    Args:
+        rows (Iterable[tuple[int, int, int]]):
+            Строки (id рецепта, id ингредиента, количество).
+        sign (int):
+            1 - ингредиенты добавляются, -1 - удаляются.
+
+    Returns:
+        dict[tuple[int, int], int]:
+            Изменение количества по парам (id пользователя, id ингредиента).
+    """
+    rows = list(rows)
+    recipe_users = defaultdict(list)
+    for recipe_id, user_id in ShoppingCart.objects.filter(
+        recipe__in={recipe_id for recipe_id, _, _ in rows}
+    ).values_list('recipe', 'user'):
+        recipe_users[recipe_id].append(user_id)
+    deltas = defaultdict(int)
+    for recipe_id, ingredient_id, amount in rows:
+        for user_id in recipe_users[recipe_id]:
+            deltas[user_id, ingredient_id] += sign * amount
+    return deltas
+
+
+def get_cart_deltas(
+    carts: Iterable[tuple[int, int]], sign: int = 1
+) -> dict[tuple[int, int], int]:
+    """Получить изменения корзин при добавлении или удалении рецептов.
+
+    Args:
+        carts (Iterable[tuple[int, int]]):
+            Пары (id пользователя, id рецепта).
+        sign (int):
+            1 - рецепты добавляются в корзину, -1 - удаляются.
+
+    Returns:
+        dict[tuple[int, int], int]:
+            Изменение количества по парам (id пользователя, id ингредиента).
+    """
+    carts = list(carts)
+    recipe_amounts = defaultdict(list)
+    for recipe_id, ingredient_id, amount in (
+        RecipeIngredients.objects.filter(
+            recipe__in={recipe_id for _, recipe_id in carts}
+        ).values_list('recipe', 'ingredient', 'amount')
+    ):
+        recipe_amounts[recipe_id].append((ingredient_id, amount))
+    deltas = defaultdict(int)
+    for user_id, recipe_id in carts:
+        for ingredient_id, amount in recipe_amounts[recipe_id]:
+            deltas[user_id, ingredient_id] += sign * amount
+    return deltas
+
+
+def update_shopping_cart_totals(deltas: dict[tuple[int, int], int]) -> None:
+    """Применить изменения к суммарным количествам ингредиентов в корзинах.
+
+    Изменения применяются через `INSERT ... ON CONFLICT DO UPDATE`:
+    одновременное первое добавление ингредиента в корзину не приводит
+    к ошибке уникальности. Строки обрабатываются в порядке ключей,
+    чтобы параллельные транзакции не блокировали друг друга.
+
+    Args:
+        deltas (dict[tuple[int, int], int]):
+            Изменение количества по парам (id пользователя, id ингредиента).
+    """
+    deltas = sorted((key, delta) for key, delta in deltas.items() if delta)
+    if not deltas:
+        return
+    table = ShoppingCartIngredient._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(deltas), CART_TOTALS_BATCH_SIZE):
+            batch = deltas[start:start + CART_TOTALS_BATCH_SIZE]
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, ingredient_id, amount) '
+                f'VALUES {", ".join(["(%s, %s, %s)"] * len(batch))} '
+                'ON CONFLICT (user_id, ingredient_id) DO UPDATE '
+                f'SET amount = {table}.amount + EXCLUDED.amount',
+                [
+                    value
+                    for (user_id, ingredient_id), delta in batch
+                    for value in (user_id, ingredient_id, delta)
+                ],
+            )
+        ShoppingCartIngredient.objects.filter(
+            user__in={user_id for (user_id, _), _ in deltas},
+            ingredient__in={ingredient_id for (_, ingredient_id), _ in deltas},
+            amount__lte=0,
+        ).delete()
+
+
+def shopping_cart_to_txt(ingredients: Iterable[dict]) -> Iterator[str]:
+    """Построчно формирует список покупок в текстовом виде."""
+    yield 'Ваш список покупок: \n\n'
+    for ingredient in ingredients:
+        yield (
+            f'{ingredient["name"]} ({ingredient["measurement_unit"]}) '
+            f'- {ingredient["amount"]}\n'
+        )
+    yield '\nПриятных покупок!\nВаш Foodgram.'
+
+
+def shopping_cart_to_csv(ingredients: Iterable[dict]) -> Iterator[str]:
+    """Построчно формирует список покупок в формате CSV."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Ингредиент', 'Единица измерения', 'Количество'))
+    for ingredient in ingredients:
+        yield writer.writerow(
+            (
+                ingredient['name'],
+                ingredient['measurement_unit'],
+                ingredient['amount'],
+            )
+        )
+
+
+def shopping_cart_to_json(ingredients: Iterable[dict]) -> Iterator[str]:
+    """Поэлементно формирует список покупок в виде JSON-массива."""
+    yield '['
+    for index, ingredient in enumerate(ingredients):
+        yield (', ' if index else '') + json.dumps(
+            {
+                'name': ingredient['name'],
+                'measurement_unit': ingredient['measurement_unit'],
+                'amount': ingredient['amount'],
+            },
+            ensure_ascii=False,
+        )
+    yield ']'
+
+
+SHOPPING_CART_WRITERS = {
+    'txt': shopping_cart_to_txt,
+    'csv': shopping_cart_to_csv,
+    'json': shopping_cart_to_json,
+}
@@ -1,23 +1,46 @@
-from django.db.models import Q
-from django.http.response import HttpResponse
+from django.db.models import (
+    BooleanField,
+    Exists,
+    F,
+    OuterRef,
+    Prefetch,
+    Q,
+    Subquery,
+    Value,
+)
+from django.db import transaction
+from django.core.handlers.asgi import ASGIRequest
+from django.http.response import StreamingHttpResponse
 from django.contrib.auth import get_user_model
 from rest_framework.response import Response
 from rest_framework import viewsets
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
 from rest_framework.permissions import DjangoModelPermissions, IsAuthenticated
 from djoser.views import UserViewSet as DjoserUserViewSet
 
 from core.config import Constans
-from api.paginators import PageLimitPagination
+from api.cache import RESPONSE_CACHE, get_version
+from api.paginators import PageOrCursorPagination
 from api.permissions import IsAuthorOrReadOnly
-from .mixins import AddOrDeleteRelationForUserViewMixin
-from .utils import get_shoping_cart
+from api.renderers import CSVRenderer, PlainTextRenderer
+from .mixins import (
+    AddOrDeleteRelationForUserViewMixin,
+    CachedReadOnlyViewMixin,
+)
+from .utils import (
+    SHOPPING_CART_WRITERS,
+    change_counter,
+    get_shopping_cart_ingredients,
+    rank_by_coverage,
+)
 from users.models import Follow
-from api.filters import IngredientFilter
+from api.filters import IngredientFilter, RecipeFilter
 from recipes.models import (
     Tag,
     Ingredient,
     Recipe,
+    RecipeIngredients,
     FavoriteRecipe,
     ShoppingCart
 )
@@ -27,6 +50,8 @@ from .serializers import (
     RecipeSerializer,
     ReadRecipeSerializer,
     RecipeReadSerializer,
+    CookQuerySerializer,
+    CookRecipeSerializer,
     FollowSerializer
 )
 
@@ -34,21 +59,34 @@ from .serializers import (
 User = get_user_model()
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(CachedReadOnlyViewMixin, viewsets.ReadOnlyModelViewSet):
     """Контроллер для получения тегов"""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    cache_namespace = 'tags'
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(
+    CachedReadOnlyViewMixin,
+    viewsets.ReadOnlyModelViewSet
+):
     """Контроллер для получения ингридиентов"""
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
     filterset_class = IngredientFilter
+    cache_namespace = 'ingredients'
+
+    def filter_queryset(self, queryset):
+        """Ограничивает выдачу при поиске по названию."""
+        queryset = super().filter_queryset(queryset)
+        if self.action == 'list' and self.request.query_params.get('name'):
+            return queryset[:Constans.INGREDIENTS_SEARCH_LIMIT]
+        return queryset
 
 
 class RecipeViewSet(
+    CachedReadOnlyViewMixin,
     viewsets.ModelViewSet,
     AddOrDeleteRelationForUserViewMixin
 ):
@@ -57,36 +95,115 @@ class RecipeViewSet(
     serializer_class = RecipeSerializer
     relation_serializer = ReadRecipeSerializer
     permission_classes = (IsAuthorOrReadOnly,)
-    pagination_class = PageLimitPagination
+    pagination_class = PageOrCursorPagination
+    filterset_class = RecipeFilter
+    cache_namespace = 'recipes'
+    cache_alias = RESPONSE_CACHE
+    cache_query_params = (
+        'author', 'tags', 'search', 'ordering', 'page', 'limit', 'cursor'
+    )
+    cache_max_age = Constans.RECIPES_CACHE_MAX_AGE
+    cache_per_user = True
+
+    def get_data_version(self, request) -> float:
+        """Для карточки рецепта - время изменения самого рецепта и
+        справочников, иначе - версия всех рецептов."""
+        if self.action != 'retrieve':
+            return super().get_data_version(request)
+        try:
+            updated_at = Recipe.objects.filter(
+                pk=self.kwargs[self.lookup_field]
+            ).values_list('updated_at', flat=True).first()
+        except (TypeError, ValueError):
+            # Некорректный id: 404 вернёт get_object
+            updated_at = None
+        if updated_at is None:
+            return super().get_data_version(request)
+        return max(
+            updated_at.timestamp(),
+            get_version('tags'),
+            get_version('ingredients'),
+        )
 
     def get_serializer_class(self):
         if self.action in ['list', 'retrieve']:
             return RecipeReadSerializer
+        if self.action == 'cook':
+            return CookRecipeSerializer
         return RecipeSerializer
 
+    def get_serializer_context(self):
+        """Добавляет в контекст id авторов, на которых подписан
+        пользователь, чтобы не проверять подписку для каждого рецепта.
+        """
+        context = super().get_serializer_context()
+        user = self.request.user
+        if (
+            self.action in ('list', 'retrieve', 'cook')
+            and user.is_authenticated
+        ):
+            context['subscriptions'] = set(
+                user.follower.values_list('following_id', flat=True)
+            )
+        return context
+
     def get_queryset(self):
         user = self.request.user
-        queryset = Recipe.objects.all()
-
-        author_id = self.request.query_params.get('author')
-        list_tags = self.request.query_params.getlist('tags')
-        is_favorited = self.request.query_params.get('is_favorited')
-        is_in_shopping_cart = self.request.query_params.get(
-            'is_in_shopping_cart')
-        if author_id:
-            queryset = queryset.filter(author=author_id)
-        if list_tags:
-            queryset = queryset.filter(tags__slug__in=list_tags).distinct()
+        queryset = Recipe.objects.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredient',
+                queryset=RecipeIngredients.objects.select_related(
+                    'ingredient'
+                ),
+            ),
+        ).defer('search_vector', 'ingredient_ids').order_by(
+            '-pub_date', '-id'
+        )
         if user.is_anonymous:
             return queryset
-        if is_favorited == Constans.POSITIVE_FLAG:
-            queryset = queryset.filter(in_favorites__user=user)
-        if is_in_shopping_cart == Constans.POSITIVE_FLAG:
-            queryset = queryset.filter(in_carts__user=user)
-        return queryset
+        return queryset.annotate(
+            is_favorited=Exists(
+                FavoriteRecipe.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )
+            ),
+        )
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        with transaction.atomic():
+            serializer.save(author=self.request.user)
+            change_counter(
+                User.objects.filter(pk=self.request.user.pk),
+                'recipes_count', 1
+            )
+
+    def perform_destroy(self, instance: Recipe) -> None:
+        with transaction.atomic():
+            change_counter(
+                User.objects.filter(pk=instance.author_id),
+                'recipes_count', -1
+            )
+            instance.delete()
+
+    def relation_created(self, entry) -> None:
+        if isinstance(entry, FavoriteRecipe):
+            change_counter(
+                Recipe.objects.filter(pk=entry.recipe_id),
+                'favorites_count', 1
+            )
+
+    def relation_deleted(self, entries) -> None:
+        if entries.model is FavoriteRecipe:
+            change_counter(
+                Recipe.objects.filter(pk__in=entries.values('recipe')),
+                'favorites_count', -1
+            )
 
     @action(detail=True, permission_classes=(IsAuthenticated,))
     def favorite(self, request, pk: int) -> Response:
@@ -123,21 +240,88 @@ class RecipeViewSet(
         self.relation_model = ShoppingCart
         return self.delete_relation(Q(recipe__id=pk))
 
+    @action(methods=("get",), detail=False)
+    def cook(self, request) -> Response:
+        """Что можно приготовить из имеющихся ингредиентов.
+
+        Ингредиенты передаются параметром `ingredients` - повторяющимся
+        или через запятую. Возвращает не более `limit` рецептов,
+        упорядоченных по доле имеющихся ингредиентов. Фильтры списка
+        рецептов (`tags`, `author` и другие) тоже применяются.
+        """
+        params = CookQuerySerializer(
+            data={
+                'ingredients': [
+                    value
+                    for values in request.query_params.getlist('ingredients')
+                    for value in values.split(',')
+                    if value
+                ],
+                'limit': request.query_params.get(
+                    'limit', Constans.COOK_RESULTS_LIMIT
+                ),
+            }
+        )
+        params.is_valid(raise_exception=True)
+        queryset = rank_by_coverage(
+            self.filter_queryset(self.get_queryset()),
+            sorted(set(params.validated_data['ingredients'])),
+        )[:params.validated_data['limit']]
+        return Response(self.get_serializer(queryset, many=True).data)
+
     @action(methods=("get",), detail=False,
-            permission_classes=(IsAuthenticated,))
-    def download_shopping_cart(self, request) -> Response:
-        """Получить список покупок."""
-        return HttpResponse(
-            get_shoping_cart(self.request.user),
-            content_type="text.txt; charset=utf-8"
+            permission_classes=(IsAuthenticated,),
+            renderer_classes=(PlainTextRenderer, CSVRenderer, JSONRenderer))
+    def download_shopping_cart(self, request) -> StreamingHttpResponse:
+        """Получить список покупок.
+
+        Формат файла задаётся параметром `format`: txt (по умолчанию),
+        csv или json. Через WSGI файл формируется потоком по мере
+        чтения строк из БД. Через ASGI поток отдаётся из цикла событий,
+        где обращаться к БД нельзя, поэтому строки (по одной
+        на ингредиент) читаются заранее в обработчике запроса.
+        """
+        renderer = request.accepted_renderer
+        ingredients = get_shopping_cart_ingredients(request.user)
+        if isinstance(request._request, ASGIRequest):
+            ingredients = list(ingredients)
+        else:
+            ingredients = ingredients.iterator()
+        response = StreamingHttpResponse(
+            SHOPPING_CART_WRITERS[renderer.format](ingredients),
+            content_type=f'{renderer.media_type}; charset=utf-8',
+        )
+        response['Content-Disposition'] = (
+            'attachment; '
+            f'filename="{Constans.SHOPPING_LIST_FILENAME}.{renderer.format}"'
         )
+        return response
 
 
-class UserViewSet(DjoserUserViewSet, AddOrDeleteRelationForUserViewMixin):
+class UserViewSet(
+    CachedReadOnlyViewMixin,
+    DjoserUserViewSet,
+    AddOrDeleteRelationForUserViewMixin
+):
     """Контроллер для работы с пользователями"""
-    pagination_class = PageLimitPagination
+    pagination_class = PageOrCursorPagination
     permission_classes = (DjangoModelPermissions,)
     relation_serializer = FollowSerializer
+    # Профили и подписки содержат рецепты, поэтому используют их версию
+    cache_namespace = 'recipes'
+    cache_alias = RESPONSE_CACHE
+    cache_per_user = True
+
+    def relation_created(self, entry: Follow) -> None:
+        change_counter(
+            User.objects.filter(pk=entry.following_id), 'followers_count', 1
+        )
+
+    def relation_deleted(self, entries) -> None:
+        change_counter(
+            User.objects.filter(pk__in=entries.values('following')),
+            'followers_count', -1
+        )
 
     @action(detail=True, permission_classes=(IsAuthenticated,))
     def subscribe(self, request, id: int) -> Response:
@@ -158,9 +342,38 @@ class UserViewSet(DjoserUserViewSet, AddOrDeleteRelationForUserViewMixin):
     @action(methods=("get",), detail=False,
             permission_classes=(IsAuthenticated,))
     def subscriptions(self, request) -> Response:
-        """Получить список подписок"""
-        pages = self.paginate_queryset(
+        """Получить список подписок."""
+        return self.get_cached_response(self.get_subscriptions, request)
+
+    def get_subscriptions(self, request) -> Response:
+        """Формирует список подписок.
+
+        Рецепты авторов загружаются одним запросом, параметр
+        `recipes_limit` ограничивает их количество на стороне БД:
+        последние рецепты каждого автора читаются по индексу
+        `recipe_author_pub_date_idx` без сортировки всех его рецептов.
+        """
+        recipes = Recipe.objects.defer('search_vector', 'ingredient_ids')
+        recipes_limit = request.query_params.get('recipes_limit')
+        if recipes_limit and recipes_limit.isdigit():
+            recipes = recipes.filter(
+                pk__in=Subquery(
+                    Recipe.objects.filter(author=OuterRef('author'))
+                    .order_by('-pub_date', '-id')
+                    .values('pk')[:int(recipes_limit)]
+                )
+            )
+        queryset = (
             User.objects.filter(following__user=self.request.user)
+            .annotate(
+                follow_id=F('following__id'),
+                is_subscribed=Value(True, output_field=BooleanField()),
+            )
+            .prefetch_related(Prefetch('recipes', queryset=recipes))
+            .order_by('-follow_id')
+        )
+        pages = self.paginate_queryset(queryset)
+        serializer = FollowSerializer(
+            pages, many=True, context=self.get_serializer_context()
         )
-        serializer = FollowSerializer(pages, many=True)
         return self.get_paginated_response(serializer.data)
@@ -0,0 +1,55 @@
+from django.db.backends.postgresql import base
+from django.utils.asyncio import async_unsafe
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL с проверкой постоянных соединений.
+
+    Аналог `CONN_HEALTH_CHECKS` из Django 4.1: соединение, оставшееся
+    с прошлого запроса, проверяется при первом обращении к БД в новом
+    запросе и закрывается, если перестало отвечать, например после
+    перезапуска БД или пулера. Запросы, не обращающиеся к БД, проверку
+    не выполняют.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_enabled = self.settings_dict.get(
+            'CONN_HEALTH_CHECKS', False
+        )
+        self.health_check_done = False
+
+    def connect(self):
+        # Новое соединение проверять не нужно
+        self.health_check_done = True
+        super().connect()
+
+    def close_if_unusable_or_obsolete(self):
+        # Вызывается в начале и в конце каждого запроса. Сама проверка
+        # обращается к соединению, но проверять его здесь рано: запрос
+        # может вовсе не использовать БД
+        self.health_check_done = True
+        super().close_if_unusable_or_obsolete()
+        if self.connection is not None:
+            self.health_check_done = False
+
+    def close_if_health_check_failed(self) -> None:
+        """Закрыть соединение, если оно не прошло проверку.
+
+        Внутри транзакции не проверяет: закрытие прервало бы её.
+        """
+        if (
+            self.connection is None
+            or not self.health_check_enabled
+            or self.health_check_done
+            or self.in_atomic_block
+        ):
+            return
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    @async_unsafe
+    def ensure_connection(self):
+        self.close_if_health_check_failed()
+        super().ensure_connection()
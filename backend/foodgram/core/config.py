@@ -17,7 +17,62 @@ class Constans:
     POSITIVE_FLAG = '1'
 
     # Кол-во объект на странице для пагинации
-    PAGE_SIZE = os.getenv('PAGE_SIZE', 20)
+    PAGE_SIZE = int(os.getenv('PAGE_SIZE', 20))
+
+    # Максимум ингредиентов в ответе на поиск по названию
+    INGREDIENTS_SEARCH_LIMIT = int(os.getenv('INGREDIENTS_SEARCH_LIMIT', 20))
+
+    # Сколько запросов процесс обрабатывает одновременно при запуске
+    # через ASGI (каждый в своём потоке)
+    ASGI_THREADS = int(os.getenv('ASGI_THREADS', 8))
+
+    # Сколько секунд после записи чтение идёт с основной БД, а не с реплики
+    REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
+
+    # Сколько секунд nginx может отдавать ответ с рецептами анонимным
+    # пользователям из своего кэша
+    RECIPES_CACHE_MAX_AGE = int(os.getenv('RECIPES_CACHE_MAX_AGE', 10))
+
+    # Конфигурация полнотекстового поиска PostgreSQL, должна совпадать
+    # с используемой в триггере поискового вектора рецептов
+    SEARCH_CONFIG = 'russian'
+
+    # Доля запросов, для которых замеряется время и количество
+    # SQL-запросов (0 - замеры отключены)
+    METRICS_SAMPLE_RATE = float(os.getenv('METRICS_SAMPLE_RATE', 0))
+
+    # Поиск рецептов по имеющимся ингредиентам: сколько ингредиентов
+    # можно передать и сколько рецептов вернуть
+    COOK_MAX_INGREDIENTS = int(os.getenv('COOK_MAX_INGREDIENTS', 100))
+    COOK_RESULTS_LIMIT = int(os.getenv('COOK_RESULTS_LIMIT', 20))
+
+    # Рейтинг trending: вес добавления в избранное и в корзину,
+    # период полураспада веса и окно учитываемых действий
+    TRENDING_FAVORITE_WEIGHT = 1.0
+    TRENDING_CART_WEIGHT = 0.5
+    TRENDING_HALF_LIFE_HOURS = 48
+    TRENDING_WINDOW_DAYS = 14
+
+    # Варианты изображений рецептов: наибольшая сторона в пикселях
+    IMAGE_VARIANT_SIZES = {
+        'list': 600,
+        'detail': 1200,
+    }
+    IMAGE_QUALITY = 85
+    # Ограничения загружаемых изображений: размер файла в байтах
+    # и наибольшая сторона в пикселях
+    IMAGE_MAX_SIZE = int(os.getenv('IMAGE_MAX_SIZE', 10 * 1024 * 1024))
+    IMAGE_MAX_DIMENSION = int(os.getenv('IMAGE_MAX_DIMENSION', 6000))
+    # Декодирование base64: размер фрагмента (кратен 4) и объём,
+    # начиная с которого изображение декодируется во временный файл
+    # на диске, а не в память
+    IMAGE_DECODE_CHUNK = 64 * 1024
+    IMAGE_SPOOL_SIZE = 1024 * 1024
+    # Количество процессов для обработки изображений
+    IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+
+    # Имя файла со списком покупок (без расширения)
+    SHOPPING_LIST_FILENAME = 'shopping_list'
 
     # Значения времени приготовления рецептов
     MIN_COOKING_TIME = 1
@@ -0,0 +1,209 @@
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from typing import Callable
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+
+from core.config import Constans
+
+
+PREFIX = 'foodgram'
+
+# Суммарные показатели по представлению: имя метрики и описание
+SUMMARIES = (
+    ('request_duration_seconds', 'Время обработки запроса'),
+    ('view_duration_seconds', 'Время работы представления'),
+    ('render_duration_seconds', 'Время рендеринга ответа'),
+    ('db_duration_seconds', 'Время выполнения SQL-запросов'),
+    ('db_queries', 'Количество SQL-запросов'),
+)
+
+
+class RequestTimings:
+    """Замеры одного запроса."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.view = None
+        self.view_start = None
+        self.view_end = None
+        self.db_duration = 0.0
+        self.db_queries = 0
+
+    def __call__(self, execute: Callable, sql, params, many, context):
+        """Обёртка `connection.execute_wrapper`, замеряющая SQL-запросы."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_duration += time.perf_counter() - start
+            self.db_queries += 1
+
+
+class MetricsRegistry:
+    """Показатели запросов, накопленные в текущем процессе."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = defaultdict(int)
+        self.counts = defaultdict(int)
+        self.sums = defaultdict(float)
+
+    def observe(self, view: str, method: str, status: int,
+                values: dict[str, float]) -> None:
+        """Учесть запрос.
+
+        Args:
+            view (str): Имя представления, например `RecipeViewSet.list`.
+            method (str): HTTP-метод.
+            status (int): Код ответа.
+            values (dict[str, float]): Значения показателей из `SUMMARIES`.
+        """
+        with self.lock:
+            self.requests[view, method, status] += 1
+            self.counts[view, method] += 1
+            for name, value in values.items():
+                self.sums[name, view, method] += value
+
+    def render(self, sample_rate: float) -> str:
+        """Показатели в текстовом формате Prometheus."""
+        with self.lock:
+            requests = sorted(self.requests.items())
+            counts = sorted(self.counts.items())
+            sums = dict(self.sums)
+        lines = [
+            f'# HELP {PREFIX}_metrics_sample_rate '
+            'Доля запросов, попадающих в метрики',
+            f'# TYPE {PREFIX}_metrics_sample_rate gauge',
+            f'{PREFIX}_metrics_sample_rate {sample_rate}',
+            f'# HELP {PREFIX}_requests_total Учтённые запросы',
+            f'# TYPE {PREFIX}_requests_total counter',
+        ]
+        for (view, method, status), total in requests:
+            lines.append(
+                f'{PREFIX}_requests_total'
+                f'{format_labels(view=view, method=method, status=status)} '
+                f'{total}'
+            )
+        for name, description in SUMMARIES:
+            lines.append(f'# HELP {PREFIX}_{name} {description}')
+            lines.append(f'# TYPE {PREFIX}_{name} summary')
+            for (view, method), total in counts:
+                labels = format_labels(view=view, method=method)
+                lines.append(
+                    f'{PREFIX}_{name}_sum{labels} '
+                    f'{sums.get((name, view, method), 0.0)}'
+                )
+                lines.append(f'{PREFIX}_{name}_count{labels} {total}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def format_labels(**labels) -> str:
+    """Метки метрики, например `{view="RecipeViewSet.list"}`."""
+    values = (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('"', '\\"')
+        .replace('\n', '\\n')
+        for value in labels.values()
+    )
+    return '{' + ','.join(
+        f'{name}="{value}"' for name, value in zip(labels, values)
+    ) + '}'
+
+
+def get_view_name(request: HttpRequest, view_func: Callable) -> str:
+    """Имя представления для меток: для вьюсетов DRF - класс и действие,
+    например `RecipeViewSet.list` или `UserViewSet.subscriptions`."""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return f'{view_func.__module__}.{view_func.__qualname__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(request.method.lower())
+    return f'{cls.__name__}.{action}' if action else cls.__name__
+
+
+class MetricsMiddleware:
+    """Замеряет количество и время SQL-запросов, время представления,
+    рендеринга и всего запроса.
+
+    Замеряется доля запросов `Constans.METRICS_SAMPLE_RATE`; при нулевой
+    доле middleware отключается. Замеры отдаются в заголовке
+    `Server-Timing` ответа и накапливаются по представлениям для
+    `metrics`. Сериализация DRF выполняется внутри представления, поэтому
+    её время входит в `view`, а время вне БД - это `view` без `db`.
+    Middleware должна быть первой в `MIDDLEWARE`, чтобы `total` включал
+    время остальных.
+    """
+
+    def __init__(self, get_response: Callable):
+        if Constans.METRICS_SAMPLE_RATE <= 0:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if random.random() >= Constans.METRICS_SAMPLE_RATE:
+            return self.get_response(request)
+        timings = request.metrics_timings = RequestTimings()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timings))
+            response = self.get_response(request)
+        end = time.perf_counter()
+        if timings.view is None:
+            return response
+        view_end = timings.view_end or end
+        values = {
+            'request_duration_seconds': end - timings.start,
+            'view_duration_seconds': view_end - timings.view_start,
+            'render_duration_seconds': end - view_end,
+            'db_duration_seconds': timings.db_duration,
+            'db_queries': timings.db_queries,
+        }
+        registry.observe(
+            timings.view, request.method, response.status_code, values
+        )
+        response['Server-Timing'] = ', '.join(
+            (
+                f'db;dur={values["db_duration_seconds"] * 1000:.1f};'
+                f'desc="{timings.db_queries} queries"',
+                f'view;dur={values["view_duration_seconds"] * 1000:.1f}',
+                f'render;dur={values["render_duration_seconds"] * 1000:.1f}',
+                f'total;dur={values["request_duration_seconds"] * 1000:.1f}',
+            )
+        )
+        return response
+
+    def process_view(self, request: HttpRequest, view_func: Callable,
+                     view_args, view_kwargs) -> None:
+        timings = getattr(request, 'metrics_timings', None)
+        if timings is not None:
+            timings.view = get_view_name(request, view_func)
+            timings.view_start = time.perf_counter()
+
+    def process_template_response(self, request: HttpRequest,
+                                  response: HttpResponse) -> HttpResponse:
+        timings = getattr(request, 'metrics_timings', None)
+        if timings is not None:
+            timings.view_end = time.perf_counter()
+        return response
+
+
+def metrics(request: HttpRequest) -> HttpResponse:
+    """Показатели текущего процесса в текстовом формате Prometheus.
+
+    Адрес не проксируется nginx и доступен только внутри сети
+    контейнеров.
+    """
+    return HttpResponse(
+        registry.render(Constans.METRICS_SAMPLE_RATE),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -0,0 +1,132 @@
+import hashlib
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Model
+from django.http import HttpRequest, HttpResponse
+
+from core.config import Constans
+
+
+REPLICA = 'replica'
+# Метки должны видеть все процессы, поэтому при настроенной реплике
+# кэш ответов должен быть общим (например, memcached), а не LocMemCache
+STICKY_CACHE = 'responses'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Токены и сессии читаются с основной БД: только что выданный токен
+# или сессия, созданная при входе в админку, может ещё не дойти до реплики
+PRIMARY_ONLY_APPS = {'authtoken', 'sessions', 'admin'}
+
+use_replica: ContextVar[bool] = ContextVar('use_replica', default=False)
+
+
+def stick_to_primary(scope: str) -> None:
+    """Направлять чтение на основную БД в течение
+    `Constans.REPLICA_STICKY_SECONDS`, пока реплика догоняет запись.
+
+    Args:
+        scope (str): Клиент (хэш заголовка `Authorization`) или группа
+            данных, например `recipes`.
+    """
+    caches[STICKY_CACHE].set(
+        f'primary:{scope}', True, Constans.REPLICA_STICKY_SECONDS
+    )
+
+
+class ReplicaRouter:
+    """Роутер, направляющий чтение безопасных запросов на реплику.
+
+    Реплика используется, только если она настроена и
+    `ReplicaMiddleware` разрешила её для текущего запроса.
+    """
+
+    def db_for_read(self, model: Model, **hints) -> Optional[str]:
+        if use_replica.get() and (
+            model._meta.app_label not in PRIMARY_ONLY_APPS
+        ):
+            return REPLICA
+        return None
+
+    def db_for_write(self, model: Model, **hints) -> Optional[str]:
+        return None
+
+    def allow_relation(self, obj1: Model, obj2: Model, **hints) -> bool:
+        return True
+
+    def allow_migrate(self, db: str, app_label: str, **hints) -> bool:
+        return db != REPLICA
+
+
+class ReplicaMiddleware:
+    """Разрешает чтение с реплики для GET, HEAD и OPTIONS запросов.
+
+    После успешного изменяющего запроса клиент несколько секунд читает
+    с основной БД и видит свои изменения. После изменения рецептов так
+    же читают все клиенты, чтобы кэш ответов не заполнился данными
+    отстающей реплики.
+    """
+
+    def __init__(self, get_response: Callable):
+        if REPLICA in settings.DATABASES and isinstance(
+            caches[STICKY_CACHE], LocMemCache
+        ):
+            raise ImproperlyConfigured(
+                f'Кэш "{STICKY_CACHE}" хранит метки чтения с основной БД '
+                'и при настроенной реплике должен быть общим для всех '
+                'процессов: укажите RESPONSE_CACHE_BACKEND, например '
+                'memcached'
+            )
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if REPLICA not in settings.DATABASES:
+            return self.get_response(request)
+        client = self.get_client(request)
+        safe = request.method in SAFE_METHODS
+        if safe:
+            scopes = ['recipes'] + ([client] if client else [])
+            safe = not caches[STICKY_CACHE].get_many(
+                [f'primary:{scope}' for scope in scopes]
+            )
+        token = use_replica.set(safe)
+        try:
+            response = self.get_response(request)
+        finally:
+            use_replica.reset(token)
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            # При входе сессия получает новый ключ, следующие запросы
+            # придут уже с ним
+            client = self.get_client(request, response) or client
+            if client:
+                stick_to_primary(client)
+        return response
+
+    def get_client(self, request: HttpRequest,
+                   response: Optional[HttpResponse] = None) -> Optional[str]:
+        """Клиент для привязки к основной БД: хэш заголовка
+        `Authorization`, а без него - cookie сессии, например в админке.
+
+        Args:
+            request (HttpRequest): Запрос.
+            response (Optional[HttpResponse]): Ответ, если cookie сессии
+                могла в нём измениться.
+
+        Returns:
+            Optional[str]: Хэш или None для анонимного клиента.
+        """
+        credentials = request.headers.get('Authorization')
+        if not credentials:
+            cookie = response and response.cookies.get(
+                settings.SESSION_COOKIE_NAME
+            )
+            credentials = (
+                cookie.value if cookie
+                else request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+            )
+        if not credentials:
+            return None
+        return hashlib.sha256(credentials.encode()).hexdigest()
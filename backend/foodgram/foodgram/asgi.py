@@ -1,7 +1,43 @@
+import asyncio
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from asgiref.sync import ThreadSensitiveContext
+from django.core.handlers.asgi import ASGIHandler
+
+from core.config import Constans
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
+
+class BoundedASGIHandler(ASGIHandler):
+    """ASGI-обработчик, выполняющий синхронные представления параллельно.
+
+    Django 3.2 выполняет все синхронные представления и middleware
+    в одном общем потоке процесса. Здесь каждый запрос получает свой
+    поток, а одновременно обрабатываются не больше `ASGI_THREADS`
+    запросов. Отправка ответа медленному клиенту идёт в цикле событий
+    и ни поток, ни место в пуле не занимает.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.semaphore = None
+
+    async def __call__(self, scope, receive, send):
+        async with ThreadSensitiveContext():
+            await super().__call__(scope, receive, send)
+
+    async def get_response_async(self, request):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(Constans.ASGI_THREADS)
+        async with self.semaphore:
+            return await super().get_response_async(request)
+
+
+def get_asgi_application() -> BoundedASGIHandler:
+    django.setup(set_prefix=False)
+    return BoundedASGIHandler()
+
+
 application = get_asgi_application()
@@ -42,7 +42,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
+    'core.routers.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -77,13 +80,72 @@ WSGI_APPLICATION = 'foodgram.wsgi.application'
 
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql",
+        # Бэкенд PostgreSQL с поддержкой CONN_HEALTH_CHECKS
+        "ENGINE": "core.backends.postgresql",
         "NAME": str(os.getenv('POSTGRES_DB', 'foodgram')),
         "USER": str(os.getenv('POSTGRES_USER', 'foodgram')),
         "PASSWORD": str(os.getenv('POSTGRES_PASSWORD', 'foodgram')),
         "HOST": str(os.getenv('DB_HOST', 'db')),
         "PORT": str(os.getenv('DB_PORT', 5432)),
+        # Время жизни соединения в секундах, 0 - закрывать после каждого
+        # запроса. В режиме ASGI оставлять 0
+        "CONN_MAX_AGE": int(os.getenv('DB_CONN_MAX_AGE', 0)),
+        # Проверять постоянное соединение перед первым обращением к БД
+        # в запросе (в Django 3.2 выполняется в core.backends.postgresql)
+        "CONN_HEALTH_CHECKS": (
+            os.getenv('DB_CONN_HEALTH_CHECKS', 'False').lower() == 'true'
+        ),
+        # Пулер соединений (PgBouncer) в режиме transaction не сохраняет
+        # серверные курсоры между транзакциями
+        "DISABLE_SERVER_SIDE_CURSORS": (
+            os.getenv('DB_POOLER_TRANSACTION_MODE', 'False').lower() == 'true'
+        ),
+        "OPTIONS": {
+            "connect_timeout": int(os.getenv('DB_CONNECT_TIMEOUT', 10)),
+        },
+    }
+}
+
+# Реплика для чтения в GET запросах, см. core.routers. Требует общего
+# для всех процессов кэша ответов (RESPONSE_CACHE_BACKEND)
+if os.getenv('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        "HOST": os.getenv('DB_REPLICA_HOST'),
+        "PORT": str(os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT'])),
+        "TEST": {"MIRROR": "default"},
     }
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+# Кэш справочников (теги, ингредиенты). По умолчанию свой в каждом
+# процессе: после изменения данных другие процессы увидят их не позже,
+# чем через REFERENCE_CACHE_TIMEOUT секунд. Для мгновенной инвалидации
+# во всех процессах можно указать общий бэкенд, например memcached.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'reference': {
+        'BACKEND': os.getenv(
+            'REFERENCE_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('REFERENCE_CACHE_LOCATION', 'reference'),
+        'TIMEOUT': int(os.getenv('REFERENCE_CACHE_TIMEOUT', 300)),
+    },
+    'responses': {
+        'BACKEND': os.getenv(
+            'RESPONSE_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('RESPONSE_CACHE_LOCATION', 'responses'),
+        'TIMEOUT': int(os.getenv('RESPONSE_CACHE_TIMEOUT', 300)),
+    },
 }
 
 
@@ -1,8 +1,11 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from core.metrics import metrics
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
+    path('metrics/', metrics),
 ]
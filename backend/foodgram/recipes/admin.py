@@ -1,12 +1,14 @@
 from django.contrib import admin
 
+from api.utils import delete_recipe_ingredients
 from .models import (
     Ingredient,
     Tag,
     Recipe,
     RecipeIngredients,
     FavoriteRecipe,
-    ShoppingCart
+    ShoppingCart,
+    ShoppingCartIngredient
 )
 
 
@@ -59,10 +61,26 @@ class RecipeAdmin(admin.ModelAdmin):
     inlines = (IngredientInline,)
     save_on_top = True
 
+    def save_formset(self, request, form, formset, change) -> None:
+        """Удаляет ингредиенты из инлайна через
+        `delete_recipe_ingredients`, чтобы пересчитать корзины."""
+        if formset.model is not RecipeIngredients:
+            return super().save_formset(request, form, formset, change)
+        instances = formset.save(commit=False)
+        delete_recipe_ingredients(
+            RecipeIngredients.objects.filter(
+                pk__in=[obj.pk for obj in formset.deleted_objects]
+            )
+        )
+        for instance in instances:
+            instance.save()
+        formset.save_m2m()
+
     def count_favorites(self, obj: Recipe) -> int:
-        return obj.in_favorites.count()
+        return obj.favorites_count
 
     count_favorites.short_description = "В избранном"
+    count_favorites.admin_order_field = "favorites_count"
 
 
 @admin.register(RecipeIngredients)
@@ -70,6 +88,14 @@ class RecipeIngredientAdmin(admin.ModelAdmin):
     list_display = ('pk', 'recipe', 'ingredient', 'amount')
     list_editable = ('recipe', 'ingredient', 'amount')
 
+    def delete_model(self, request, obj: RecipeIngredients) -> None:
+        delete_recipe_ingredients(
+            RecipeIngredients.objects.filter(pk=obj.pk)
+        )
+
+    def delete_queryset(self, request, queryset) -> None:
+        delete_recipe_ingredients(queryset)
+
 
 @admin.register(FavoriteRecipe)
 class FavoriteAdmin(admin.ModelAdmin):
@@ -81,3 +107,9 @@ class FavoriteAdmin(admin.ModelAdmin):
 class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('pk', 'user', 'recipe')
     list_editable = ('user', 'recipe')
+
+
+@admin.register(ShoppingCartIngredient)
+class ShoppingCartIngredientAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'user', 'ingredient', 'amount')
+    raw_id_fields = ('user', 'ingredient')
@@ -0,0 +1,294 @@
+import base64
+import binascii
+import logging
+import multiprocessing
+import warnings
+from concurrent.futures import Future, ProcessPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
+from typing import Optional
+
+import django
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import (
+    InMemoryUploadedFile,
+    TemporaryUploadedFile,
+    UploadedFile,
+)
+from django.db.models.fields.files import FieldFile
+from PIL import Image, ImageFile, ImageOps
+
+from core.config import Constans
+
+
+logger = logging.getLogger(__name__)
+
+# Форматы вариантов: ключ в ответе API, формат Pillow и расширение файла
+VARIANT_FORMATS = (
+    ('src', 'JPEG', 'jpg'),
+    ('webp', 'WEBP', 'webp'),
+)
+
+BASE64_SEPARATOR = ';base64,'
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_variant_name(name: str, size: str, extension: str) -> str:
+    """Получить путь к варианту изображения в хранилище.
+
+    Args:
+        name (str): Путь к исходному изображению, например `recipes/a.png`.
+        size (str): Название размера из `Constans.IMAGE_VARIANT_SIZES`
+            или `original`.
+        extension (str): Расширение файла варианта.
+
+    Returns:
+        str: Путь вида `recipes/variants/a_list.webp`.
+    """
+    path = PurePosixPath(name)
+    return str(path.parent / 'variants' / f'{path.stem}_{size}.{extension}')
+
+
+def get_variant_urls(image: FieldFile) -> Optional[dict]:
+    """Получить ссылки на все варианты изображения.
+
+    Args:
+        image (FieldFile): Изображение рецепта.
+
+    Returns:
+        Optional[dict]: Ссылки по размерам и форматам, для размера
+            `original` в `src` - исходный файл.
+    """
+    if not image:
+        return None
+    urls = {
+        size: {
+            key: default_storage.url(
+                get_variant_name(image.name, size, extension)
+            )
+            for key, _, extension in VARIANT_FORMATS
+        }
+        for size in Constans.IMAGE_VARIANT_SIZES
+    }
+    urls['original'] = {
+        'src': image.url,
+        'webp': default_storage.url(
+            get_variant_name(image.name, 'original', 'webp')
+        ),
+    }
+    return urls
+
+
+def check_size(size: int) -> None:
+    """Проверить, что размер файла не превышает `Constans.IMAGE_MAX_SIZE`."""
+    if size > Constans.IMAGE_MAX_SIZE:
+        raise ValidationError(
+            'Размер изображения не должен превышать '
+            f'{Constans.IMAGE_MAX_SIZE // (1024 * 1024)} МБ'
+        )
+
+
+def get_dimensions_error() -> ValidationError:
+    """Ошибка превышения допустимых ширины и высоты изображения."""
+    return ValidationError(
+        'Ширина и высота изображения не должны превышать '
+        f'{Constans.IMAGE_MAX_DIMENSION} пикселей'
+    )
+
+
+def check_dimensions(image: Image.Image) -> None:
+    """Проверить ширину и высоту изображения, прочитанные из заголовка."""
+    if max(image.size) > Constans.IMAGE_MAX_DIMENSION:
+        raise get_dimensions_error()
+
+
+def feed_header(parser: Optional[ImageFile.Parser], chunk: bytes):
+    """Передать очередной фрагмент файла парсеру заголовка.
+
+    Как только Pillow прочитал заголовок, проверяет размеры изображения
+    и возвращает None: остальные фрагменты парсеру уже не нужны.
+
+    Args:
+        parser (Optional[ImageFile.Parser]): Парсер или None, если
+            заголовок уже проверен.
+        chunk (bytes): Фрагмент файла.
+
+    Returns:
+        Optional[ImageFile.Parser]: Парсер, если заголовок ещё не прочитан.
+
+    Raises:
+        ValidationError: Изображение превышает допустимые размеры.
+    """
+    if parser is None:
+        return None
+    # Pillow сам отклоняет заголовки с огромным числом пикселей
+    # (DecompressionBombError) или предупреждает о них; предупреждение
+    # превращается в исключение, чтобы такой файл не дошёл до декодирования
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', Image.DecompressionBombWarning)
+            parser.feed(chunk)
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+        raise get_dimensions_error()
+    if parser.image is None:
+        return parser
+    check_dimensions(parser.image)
+    return None
+
+
+def check_image(file: File) -> None:
+    """Проверить загруженный файл изображения до его полного декодирования.
+
+    Args:
+        file (File): Файл из `multipart/form-data` запроса.
+
+    Raises:
+        ValidationError: Файл слишком большой, не является изображением
+            или превышает допустимые размеры.
+    """
+    check_size(file.size)
+    parser = ImageFile.Parser()
+    file.seek(0)
+    for chunk in file.chunks(Constans.IMAGE_DECODE_CHUNK):
+        parser = feed_header(parser, chunk)
+        if parser is None:
+            break
+    file.seek(0)
+    if parser is not None:
+        raise ValidationError('Загруженный файл не является изображением')
+
+
+def decode_base64_image(data: str) -> UploadedFile:
+    """Декодировать изображение из data URI по частям во временный файл.
+
+    Размер проверяется по длине строки ещё до декодирования, а размеры
+    изображения - по заголовку из первых декодированных фрагментов.
+    Изображение до `Constans.IMAGE_SPOOL_SIZE` байт декодируется
+    в память, большее - во временный файл на диске, который Django
+    при проверке передаёт Pillow по пути. Поэтому строка и декодированные
+    байты не лежат в памяти одновременно целиком.
+
+    Args:
+        data (str): Строка вида `data:image/png;base64,...`.
+
+    Returns:
+        UploadedFile: Декодированный файл.
+
+    Raises:
+        ValidationError: Строка не является корректным изображением
+            в base64 или превышает допустимые размеры.
+    """
+    start = data.find(BASE64_SEPARATOR)
+    if start == -1:
+        raise ValidationError('Изображение должно быть закодировано в base64')
+    content_type = data[len('data:'):start]
+    start += len(BASE64_SEPARATOR)
+    size = (len(data) - start) * 3 // 4
+    check_size(size)
+
+    name = 'temp.' + content_type.split('/')[-1]
+    if size > Constans.IMAGE_SPOOL_SIZE:
+        file = TemporaryUploadedFile(name, content_type, 0, None)
+    else:
+        file = InMemoryUploadedFile(
+            BytesIO(), None, name, content_type, 0, None
+        )
+    parser = ImageFile.Parser()
+    rest = ''
+    for offset in range(start, len(data), Constans.IMAGE_DECODE_CHUNK):
+        encoded = rest + ''.join(
+            data[offset:offset + Constans.IMAGE_DECODE_CHUNK].split()
+        )
+        usable = len(encoded) - len(encoded) % 4
+        rest = encoded[usable:]
+        try:
+            chunk = base64.b64decode(encoded[:usable])
+        except binascii.Error:
+            file.close()
+            raise ValidationError('Некорректная строка base64')
+        file.write(chunk)
+        try:
+            parser = feed_header(parser, chunk)
+        except ValidationError:
+            file.close()
+            raise
+    if rest or parser is not None:
+        file.close()
+        raise ValidationError('Загруженный файл не является изображением')
+
+    file.size = file.tell()
+    file.seek(0)
+    return file
+
+
+def save_variant(image: Image.Image, name: str, image_format: str) -> None:
+    """Закодировать изображение и сохранить его, заменив старый файл."""
+    buffer = BytesIO()
+    image.save(buffer, image_format, quality=Constans.IMAGE_QUALITY)
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def generate_variants(name: str) -> None:
+    """Создать уменьшенные копии изображения в JPEG и WebP.
+
+    Изображение декодируется один раз, из него получаются все варианты.
+
+    Args:
+        name (str): Путь к исходному изображению в хранилище.
+    """
+    with default_storage.open(name) as file:
+        original = ImageOps.exif_transpose(Image.open(file))
+        original = original.convert('RGB')
+    for size, max_side in Constans.IMAGE_VARIANT_SIZES.items():
+        variant = original.copy()
+        variant.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        for _, image_format, extension in VARIANT_FORMATS:
+            save_variant(
+                variant,
+                get_variant_name(name, size, extension),
+                image_format,
+            )
+    save_variant(
+        original, get_variant_name(name, 'original', 'webp'), 'WEBP'
+    )
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Пул процессов для обработки изображений, создаётся при первом
+    обращении в каждом рабочем процессе сервера.
+
+    Процессы запускаются через `spawn`, а не `fork`, чтобы не унаследовать
+    открытые соединения с БД родительского процесса.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=Constans.IMAGE_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup,
+        )
+    return _executor
+
+
+def log_failure(future: Future) -> None:
+    if future.exception() is not None:
+        logger.error(
+            'Не удалось создать варианты изображения',
+            exc_info=future.exception(),
+        )
+
+
+def schedule_variants(name: str) -> None:
+    """Поставить создание вариантов изображения в очередь пула процессов.
+
+    Args:
+        name (str): Путь к исходному изображению в хранилище.
+    """
+    get_executor().submit(generate_variants, name).add_done_callback(
+        log_failure
+    )
@@ -0,0 +1,70 @@
+import random
+import statistics
+import time
+
+from django.core.cache import caches
+from django.core.management import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from api.cache import REFERENCE_CACHE
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержку автодополнения ингредиентов: запрос на каждое '
+        'нажатие клавиши при наборе названий, выводит p50, p95 и максимум. '
+        'Запросы выполняются в процессе, без сети и веб-сервера.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'words', nargs='*',
+            help='Набираемые слова, по умолчанию случайные названия из БД',
+        )
+        parser.add_argument(
+            '--samples', type=int, default=20,
+            help='Сколько случайных названий набрать, если слова не заданы',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=3,
+            help='Сколько раз набрать каждое слово',
+        )
+        parser.add_argument(
+            '--cached', action='store_true',
+            help='Не очищать кэш справочников перед запросами',
+        )
+
+    def handle(self, *args, words, samples, repeat, cached, **options):
+        if not words:
+            names = list(Ingredient.objects.values_list('name', flat=True))
+            if not names:
+                raise CommandError('Нет ингредиентов, загрузите их loadcsv')
+            words = random.sample(names, min(samples, len(names)))
+        client = APIClient()
+        url = reverse('ingredients-list')
+        timings = []
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for _ in range(repeat):
+                for word in words:
+                    for length in range(1, len(word) + 1):
+                        if not cached:
+                            caches[REFERENCE_CACHE].clear()
+                        start = time.perf_counter()
+                        response = client.get(url, {'name': word[:length]})
+                        timings.append(time.perf_counter() - start)
+                        if response.status_code != 200:
+                            raise CommandError(
+                                f'{word[:length]}: {response.status_code}'
+                            )
+        percentiles = statistics.quantiles(timings, n=100)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Нажатий: {len(timings)}, '
+                f'p50 {percentiles[49] * 1000:.1f} мс, '
+                f'p95 {percentiles[94] * 1000:.1f} мс, '
+                f'максимум {max(timings) * 1000:.1f} мс'
+            )
+        )
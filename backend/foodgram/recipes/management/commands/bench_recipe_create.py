@@ -0,0 +1,130 @@
+import base64
+import statistics
+import time
+import uuid
+from collections import Counter
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api.cache import REFERENCE_CACHE
+from recipes.models import Ingredient, Recipe, Tag
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Считает SQL-запросы и время создания рецепта через '
+        'POST /api/recipes/. Запросы выполняются в процессе от имени '
+        'временного пользователя в транзакции, которая откатывается, '
+        'сохранённые изображения удаляются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=10,
+            help='Сколько рецептов создать',
+        )
+        parser.add_argument(
+            '--tags', type=int, default=3,
+            help='Сколько тегов у рецепта',
+        )
+        parser.add_argument(
+            '--ingredients', type=int, default=10,
+            help='Сколько ингредиентов у рецепта',
+        )
+        parser.add_argument(
+            '--cached', action='store_true',
+            help='Не очищать кэш справочников перед запросами',
+        )
+
+    def handle(self, *args, repeat, tags, ingredients, cached, **options):
+        tag_ids = list(Tag.objects.values_list('id', flat=True)[:tags])
+        ingredient_ids = list(
+            Ingredient.objects.values_list('id', flat=True)[:ingredients]
+        )
+        if not tag_ids or not ingredient_ids:
+            raise CommandError('Нет тегов или ингредиентов в БД')
+        data = {
+            'name': 'Замер создания рецепта',
+            'text': 'Описание',
+            'cooking_time': 10,
+            'image': get_image(),
+            'tags': tag_ids,
+            'ingredients': [
+                {'id': ingredient_id, 'amount': 10}
+                for ingredient_id in ingredient_ids
+            ],
+        }
+        client = APIClient()
+        url = reverse('recipes-list')
+        connection = connections[DEFAULT_DB_ALIAS]
+        counts, timings, images = [], [], []
+        statements = None
+        try:
+            with transaction.atomic(), override_settings(
+                ALLOWED_HOSTS=['testserver']
+            ):
+                name = f'bench-{uuid.uuid4().hex[:8]}'
+                client.force_authenticate(
+                    User.objects.create_user(
+                        username=name, email=f'{name}@example.com',
+                        first_name='Замер', last_name='Замер',
+                    )
+                )
+                for _ in range(repeat):
+                    if not cached:
+                        caches[REFERENCE_CACHE].clear()
+                    with CaptureQueriesContext(connection) as context:
+                        start = time.perf_counter()
+                        response = client.post(url, data, format='json')
+                        timings.append(time.perf_counter() - start)
+                    if response.status_code != 201:
+                        raise CommandError(
+                            f'{response.status_code}: {response.content!r}'
+                        )
+                    images.append(
+                        Recipe.objects.get(pk=response.json()['id']).image.name
+                    )
+                    counts.append(len(context.captured_queries))
+                    if statements is None:
+                        statements = context.captured_queries
+                transaction.set_rollback(True)
+        finally:
+            for image in images:
+                default_storage.delete(image)
+
+        kinds = Counter(
+            query['sql'].split(None, 1)[0].upper() for query in statements
+        )
+        if options['verbosity'] > 1:
+            for query in statements:
+                self.stdout.write(query['sql'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Рецептов: {repeat}, запросов на POST: '
+                f'{min(counts)}-{max(counts)} '
+                f'({", ".join(f"{kind} {n}" for kind, n in kinds.items())}), '
+                f'p50 {statistics.median(timings) * 1000:.1f} мс, '
+                f'максимум {max(timings) * 1000:.1f} мс'
+            )
+        )
+
+
+def get_image() -> str:
+    """Небольшое изображение PNG в base64 для тела запроса."""
+    buffer = BytesIO()
+    Image.new('RGB', (64, 64), 'white').save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
@@ -0,0 +1,78 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from django.core.management import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный замер пропускной способности запущенного бэкенда: '
+        'параллельные GET-запросы к адресам, выводит запросы в секунду, '
+        'p50, p95 и ошибки. Для сравнения WSGI и ASGI запустите его '
+        'против развёртывания по умолчанию и с SERVER_MODE=asgi.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'urls', nargs='+',
+            help='Адреса, например http://localhost:10000/api/recipes/',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=16,
+            help='Сколько запросов выполняется одновременно',
+        )
+        parser.add_argument(
+            '--requests', type=int, default=500,
+            help='Сколько запросов отправить на каждый адрес',
+        )
+        parser.add_argument(
+            '--token',
+            help='Токен пользователя для адресов, требующих авторизации',
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=30,
+            help='Тайм-аут одного запроса в секундах',
+        )
+
+    def handle(self, *args, urls, concurrency, requests, token, timeout,
+               **options):
+        headers = {'Authorization': f'Token {token}'} if token else {}
+
+        def fetch(url: str):
+            start = time.perf_counter()
+            try:
+                with urlopen(Request(url, headers=headers),
+                             timeout=timeout) as response:
+                    response.read()
+                    status = response.status
+            except HTTPError as error:
+                status = error.code
+            except (URLError, OSError):
+                status = None
+            return status, time.perf_counter() - start
+
+        with ThreadPoolExecutor(concurrency) as executor:
+            for url in urls:
+                status, _ = fetch(url)
+                if status is None:
+                    raise CommandError(f'{url}: сервер недоступен')
+                start = time.perf_counter()
+                results = list(executor.map(fetch, [url] * requests))
+                elapsed = time.perf_counter() - start
+                timings = [duration for _, duration in results]
+                errors = sum(
+                    1 for status, _ in results
+                    if status is None or status >= 400
+                )
+                percentiles = statistics.quantiles(timings, n=100)
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f'{url}: {requests / elapsed:.1f} запросов/с, '
+                        f'p50 {percentiles[49] * 1000:.1f} мс, '
+                        f'p95 {percentiles[94] * 1000:.1f} мс, '
+                        f'ошибок {errors}'
+                    )
+                )
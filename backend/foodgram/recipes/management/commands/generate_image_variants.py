@@ -0,0 +1,24 @@
+from django.core.management import BaseCommand
+
+from recipes.images import generate_variants, get_executor
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт уменьшенные копии изображений рецептов, например для '
+        'рецептов, загруженных до появления вариантов или через админку.'
+    )
+
+    def handle(self, *args, **options):
+        names = (
+            Recipe.objects.exclude(image='')
+            .values_list('image', flat=True)
+            .iterator()
+        )
+        processed = 0
+        for _ in get_executor().map(generate_variants, names):
+            processed += 1
+        self.stdout.write(
+            self.style.SUCCESS(f'Обработано изображений: {processed}')
+        )
@@ -1,24 +1,80 @@
 import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
+from typing import Iterator
 
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
 
+from api.cache import bump_version
 from recipes.models import Ingredient
 
 
 class Command(BaseCommand):
+    help = (
+        'Загружает ингредиенты из CSV (название, единица измерения) '
+        'или JSON файлов. Уже существующие ингредиенты пропускаются.'
+    )
 
     def add_arguments(self, parser):
         parser.add_argument('csv_file', nargs='+', type=str)
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество строк в одном INSERT.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Прочитать файлы без записи в БД.',
+        )
 
     def handle(self, *args, **options):
-        for csv_file in options['csv_file']:
-            dataReader = csv.reader(
-                open(csv_file, encoding='utf-8'),
-                delimiter=','
-            )
-            for row in dataReader:
-                ingr = Ingredient(
-                    name=row[0],
-                    measurement_unit=row[1]
+        created = 0
+        for path in options['csv_file']:
+            started = time.monotonic()
+            count_before = Ingredient.objects.count()
+            rows = 0
+            ingredients = self.read_ingredients(Path(path))
+            while batch := list(islice(ingredients, options['batch_size'])):
+                rows += len(batch)
+                if not options['dry_run']:
+                    Ingredient.objects.bulk_create(
+                        batch, ignore_conflicts=True
+                    )
+            file_created = Ingredient.objects.count() - count_before
+            created += file_created
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'{path}: прочитано {rows}, добавлено {file_created} '
+                    f'за {elapsed:.2f} с ({rows / max(elapsed, 1e-6):.0f} '
+                    'строк/с)'
                 )
-                ingr.save()
+            )
+        if created:
+            bump_version('ingredients')
+
+    def read_ingredients(self, path: Path) -> Iterator[Ingredient]:
+        """Построчно читает ингредиенты из CSV или JSON файла."""
+        try:
+            with open(path, encoding='utf-8') as file:
+                if path.suffix.lower() == '.json':
+                    rows = (
+                        (row['name'], row['measurement_unit'])
+                        for row in json.load(file)
+                    )
+                else:
+                    rows = csv.reader(file, delimiter=',')
+                for row in rows:
+                    if not row:
+                        continue
+                    name, measurement_unit = row
+                    yield Ingredient(
+                        name=name.strip(),
+                        measurement_unit=measurement_unit.strip(),
+                    )
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(f'{path}: {error}')
@@ -0,0 +1,40 @@
+from collections import defaultdict
+
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+
+from api.utils import update_shopping_cart_totals
+from recipes.models import RecipeIngredients, ShoppingCartIngredient
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает суммарные количества ингредиентов в корзинах '
+        'и исправляет разошедшиеся значения.'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            deltas = defaultdict(int)
+            for user_id, ingredient_id, total in (
+                RecipeIngredients.objects.filter(
+                    recipe__in_carts__isnull=False
+                )
+                .values_list('recipe__in_carts__user', 'ingredient')
+                .annotate(total=Sum('amount'))
+                .order_by()
+            ):
+                deltas[user_id, ingredient_id] += total
+            for user_id, ingredient_id, amount in (
+                ShoppingCartIngredient.objects.select_for_update()
+                .values_list('user', 'ingredient', 'amount')
+            ):
+                deltas[user_id, ingredient_id] -= amount
+            deltas = {key: delta for key, delta in deltas.items() if delta}
+            update_shopping_cart_totals(deltas)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Корзины: исправлено {len(deltas)} строк ингредиентов'
+            )
+        )
@@ -0,0 +1,65 @@
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db.models import (
+    Count,
+    F,
+    Func,
+    Model,
+    OuterRef,
+    QuerySet,
+    Subquery,
+)
+from django.db.models.functions import Coalesce
+
+from recipes.models import FavoriteRecipe, Recipe
+from users.models import Follow
+
+
+User = get_user_model()
+
+
+def count_related(model: type[Model], field: str) -> Func:
+    """Подзапрос с количеством объектов `model`, ссылающихся на строку."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики избранного, рецептов и подписчиков '
+        'и исправляет разошедшиеся значения.'
+    )
+
+    def handle(self, *args, **options):
+        counters = (
+            (Recipe.objects.all(), 'favorites_count',
+             count_related(FavoriteRecipe, 'recipe')),
+            (User.objects.all(), 'recipes_count',
+             count_related(Recipe, 'author')),
+            (User.objects.all(), 'followers_count',
+             count_related(Follow, 'following')),
+        )
+        for queryset, field, actual in counters:
+            fixed = self.reconcile(queryset, field, actual)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'{queryset.model.__name__}.{field}: исправлено {fixed}'
+                )
+            )
+
+    def reconcile(self, queryset: QuerySet, field: str, actual: Func) -> int:
+        """Обновляет счётчик только у строк, где он разошёлся с данными."""
+        drifted = queryset.annotate(actual=actual).exclude(
+            **{field: F('actual')}
+        )
+        return queryset.filter(pk__in=drifted.values('pk')).update(
+            **{field: actual}
+        )
@@ -0,0 +1,53 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api.cache import bump_recipes_version
+from core.config import Constans
+from recipes.models import FavoriteRecipe, Recipe, ShoppingCart
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рейтинг trending: добавления в избранное и в корзину '
+        'за последние дни с весом, убывающим со временем. Запускается '
+        'периодически, например из cron.'
+    )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        since = now - timedelta(days=Constans.TRENDING_WINDOW_DAYS)
+        half_life = timedelta(hours=Constans.TRENDING_HALF_LIFE_HOURS)
+        scores = defaultdict(float)
+        for model, weight in (
+            (FavoriteRecipe, Constans.TRENDING_FAVORITE_WEIGHT),
+            (ShoppingCart, Constans.TRENDING_CART_WEIGHT),
+        ):
+            actions = model.objects.filter(created__gte=since).values_list(
+                'recipe', 'created'
+            )
+            for recipe_id, created in actions.iterator():
+                scores[recipe_id] += weight * 0.5 ** (
+                    (now - created) / half_life
+                )
+
+        with transaction.atomic():
+            Recipe.objects.filter(trending_score__gt=0).exclude(
+                pk__in=list(scores)
+            ).update(trending_score=0)
+            Recipe.objects.bulk_update(
+                [
+                    Recipe(pk=recipe_id, trending_score=score)
+                    for recipe_id, score in scores.items()
+                ],
+                ('trending_score',),
+                batch_size=1000,
+            )
+            # bulk_update не отправляет сигналы, кэш сбрасывается явно
+            bump_recipes_version()
+        self.stdout.write(
+            self.style.SUCCESS(f'Рейтинг обновлён у {len(scores)} рецептов')
+        )
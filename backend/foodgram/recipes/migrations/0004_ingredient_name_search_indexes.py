@@ -0,0 +1,33 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """Индексы для поиска ингредиентов по названию.
+
+    Поиск выполняется через `UPPER(name) LIKE UPPER(...)`: B-tree индекс
+    с `text_pattern_ops` обслуживает поиск по началу названия,
+    триграммный GIN индекс - поиск по вхождению.
+    """
+
+    dependencies = [
+        ('recipes', '0003_shoppingcartingredient'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunSQL(
+            sql=(
+                'CREATE INDEX ingredient_name_pattern_idx '
+                'ON recipes_ingredient (UPPER(name) text_pattern_ops);'
+            ),
+            reverse_sql='DROP INDEX ingredient_name_pattern_idx;',
+        ),
+        migrations.RunSQL(
+            sql=(
+                'CREATE INDEX ingredient_name_trgm_idx '
+                'ON recipes_ingredient USING gin (UPPER(name) gin_trgm_ops);'
+            ),
+            reverse_sql='DROP INDEX ingredient_name_trgm_idx;',
+        ),
+    ]
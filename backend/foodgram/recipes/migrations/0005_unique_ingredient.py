@@ -0,0 +1,62 @@
+# Generated by Django 3.2 on 2026-10-18 02:34
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Объединяет повторно загруженные ингредиенты в один."""
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredients = apps.get_model('recipes', 'RecipeIngredients')
+    ShoppingCartIngredient = apps.get_model(
+        'recipes', 'ShoppingCartIngredient'
+    )
+    duplicates = (
+        Ingredient.objects.values('name', 'measurement_unit')
+        .annotate(kept_id=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+        .order_by()
+    )
+    for duplicate in duplicates:
+        kept_id = duplicate['kept_id']
+        extra = Ingredient.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit'],
+        ).exclude(pk=kept_id)
+        RecipeIngredients.objects.filter(ingredient__in=extra).update(
+            ingredient_id=kept_id
+        )
+        for total in ShoppingCartIngredient.objects.filter(
+            ingredient__in=extra
+        ):
+            kept, _ = ShoppingCartIngredient.objects.get_or_create(
+                user_id=total.user_id,
+                ingredient_id=kept_id,
+                defaults={'amount': 0},
+            )
+            kept.amount += total.amount
+            kept.save()
+            total.delete()
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_ingredient_name_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        # Удаление ингредиентов оставляет отложенные проверки внешних
+        # ключей, и PostgreSQL не даст изменить таблицу в той же транзакции
+        migrations.RunSQL(
+            'SET CONSTRAINTS ALL IMMEDIATE', migrations.RunSQL.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique ingredient'),
+        ),
+    ]
@@ -0,0 +1,165 @@
+# Generated by Django 3.2 on 2026-10-18 02:55
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+SEARCH_VECTOR_FUNCTION = '''
+CREATE FUNCTION recipes_recipe_search_vector(bigint, text, text)
+RETURNS tsvector LANGUAGE sql STABLE AS $$
+    SELECT setweight(to_tsvector('russian', coalesce($2, '')), 'A')
+        || setweight(to_tsvector('russian', coalesce((
+            SELECT string_agg(ingredient.name, ' ')
+            FROM recipes_recipeingredients AS recipe_ingredient
+            JOIN recipes_ingredient AS ingredient
+                ON ingredient.id = recipe_ingredient.ingredient_id
+            WHERE recipe_ingredient.recipe_id = $1
+        ), '')), 'B')
+        || setweight(to_tsvector('russian', coalesce($3, '')), 'C')
+$$;
+'''
+
+RECIPE_TRIGGER = '''
+CREATE FUNCTION recipes_recipe_search_vector_trigger() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.search_vector := recipes_recipe_search_vector(
+        NEW.id, NEW.name, NEW.text
+    );
+    RETURN NEW;
+END
+$$;
+
+CREATE TRIGGER recipe_search_vector
+BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe
+FOR EACH ROW EXECUTE FUNCTION recipes_recipe_search_vector_trigger();
+'''
+
+# Добавление и удаление ингредиентов обновляет рецепты одним запросом
+# на весь bulk_create или delete
+RECIPE_INGREDIENTS_TRIGGERS = '''
+CREATE FUNCTION recipes_refresh_search_vectors() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE recipes_recipe
+    SET search_vector = recipes_recipe_search_vector(id, name, text)
+    WHERE id IN (SELECT recipe_id FROM changed_rows);
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER recipeingredients_search_vector_insert
+AFTER INSERT ON recipes_recipeingredients
+REFERENCING NEW TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE FUNCTION recipes_refresh_search_vectors();
+
+CREATE TRIGGER recipeingredients_search_vector_delete
+AFTER DELETE ON recipes_recipeingredients
+REFERENCING OLD TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE FUNCTION recipes_refresh_search_vectors();
+
+CREATE FUNCTION recipes_refresh_search_vector_row() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE recipes_recipe
+    SET search_vector = recipes_recipe_search_vector(id, name, text)
+    WHERE id IN (OLD.recipe_id, NEW.recipe_id);
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER recipeingredients_search_vector_update
+AFTER UPDATE OF recipe_id, ingredient_id ON recipes_recipeingredients
+FOR EACH ROW
+WHEN (
+    OLD.recipe_id IS DISTINCT FROM NEW.recipe_id
+    OR OLD.ingredient_id IS DISTINCT FROM NEW.ingredient_id
+)
+EXECUTE FUNCTION recipes_refresh_search_vector_row();
+'''
+
+INGREDIENT_TRIGGER = '''
+CREATE FUNCTION recipes_ingredient_search_vector_trigger() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE recipes_recipe
+    SET search_vector = recipes_recipe_search_vector(id, name, text)
+    WHERE id IN (
+        SELECT recipe_id FROM recipes_recipeingredients
+        WHERE ingredient_id = NEW.id
+    );
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER ingredient_search_vector
+AFTER UPDATE OF name ON recipes_ingredient
+FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+EXECUTE FUNCTION recipes_ingredient_search_vector_trigger();
+'''
+
+
+class Migration(migrations.Migration):
+    """Полнотекстовый поиск рецептов.
+
+    Поисковый вектор собирается из названия (вес A), названий
+    ингредиентов (вес B) и описания (вес C) и поддерживается триггерами
+    при изменении рецепта, его ингредиентов и названий ингредиентов.
+    """
+
+    dependencies = [
+        ('recipes', '0009_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='recipe_search_vector_idx'),
+        ),
+        migrations.RunSQL(
+            sql=SEARCH_VECTOR_FUNCTION,
+            reverse_sql=(
+                'DROP FUNCTION recipes_recipe_search_vector(bigint, text, text);'
+            ),
+        ),
+        migrations.RunSQL(
+            sql=RECIPE_TRIGGER,
+            reverse_sql=(
+                'DROP TRIGGER recipe_search_vector ON recipes_recipe;'
+                'DROP FUNCTION recipes_recipe_search_vector_trigger();'
+            ),
+        ),
+        migrations.RunSQL(
+            sql=RECIPE_INGREDIENTS_TRIGGERS,
+            reverse_sql=(
+                'DROP TRIGGER recipeingredients_search_vector_insert '
+                'ON recipes_recipeingredients;'
+                'DROP TRIGGER recipeingredients_search_vector_delete '
+                'ON recipes_recipeingredients;'
+                'DROP TRIGGER recipeingredients_search_vector_update '
+                'ON recipes_recipeingredients;'
+                'DROP FUNCTION recipes_refresh_search_vectors();'
+                'DROP FUNCTION recipes_refresh_search_vector_row();'
+            ),
+        ),
+        migrations.RunSQL(
+            sql=INGREDIENT_TRIGGER,
+            reverse_sql=(
+                'DROP TRIGGER ingredient_search_vector ON recipes_ingredient;'
+                'DROP FUNCTION recipes_ingredient_search_vector_trigger();'
+            ),
+        ),
+        migrations.RunSQL(
+            sql=(
+                'UPDATE recipes_recipe SET search_vector = '
+                'recipes_recipe_search_vector(id, name, text);'
+            ),
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,126 @@
+# Generated by Django 3.2 on 2026-10-18 02:57
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+INGREDIENT_IDS_FUNCTION = '''
+CREATE FUNCTION recipes_recipe_ingredient_ids(bigint)
+RETURNS bigint[] LANGUAGE sql STABLE AS $$
+    SELECT coalesce(
+        array_agg(DISTINCT ingredient_id ORDER BY ingredient_id), '{}'
+    )
+    FROM recipes_recipeingredients
+    WHERE recipe_id = $1
+$$;
+'''
+
+# Функции триггеров из 0010 дополнительно обновляют ingredient_ids,
+# чтобы рецепт по-прежнему обновлялся одним запросом
+TRIGGER_FUNCTIONS = '''
+CREATE OR REPLACE FUNCTION recipes_recipe_search_vector_trigger()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.search_vector := recipes_recipe_search_vector(
+        NEW.id, NEW.name, NEW.text
+    );
+    NEW.ingredient_ids := recipes_recipe_ingredient_ids(NEW.id);
+    RETURN NEW;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION recipes_refresh_search_vectors()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE recipes_recipe
+    SET search_vector = recipes_recipe_search_vector(id, name, text),
+        ingredient_ids = recipes_recipe_ingredient_ids(id)
+    WHERE id IN (SELECT recipe_id FROM changed_rows);
+    RETURN NULL;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION recipes_refresh_search_vector_row()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE recipes_recipe
+    SET search_vector = recipes_recipe_search_vector(id, name, text),
+        ingredient_ids = recipes_recipe_ingredient_ids(id)
+    WHERE id IN (OLD.recipe_id, NEW.recipe_id);
+    RETURN NULL;
+END
+$$;
+'''
+
+PREVIOUS_TRIGGER_FUNCTIONS = '''
+CREATE OR REPLACE FUNCTION recipes_recipe_search_vector_trigger()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.search_vector := recipes_recipe_search_vector(
+        NEW.id, NEW.name, NEW.text
+    );
+    RETURN NEW;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION recipes_refresh_search_vectors()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE recipes_recipe
+    SET search_vector = recipes_recipe_search_vector(id, name, text)
+    WHERE id IN (SELECT recipe_id FROM changed_rows);
+    RETURN NULL;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION recipes_refresh_search_vector_row()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE recipes_recipe
+    SET search_vector = recipes_recipe_search_vector(id, name, text)
+    WHERE id IN (OLD.recipe_id, NEW.recipe_id);
+    RETURN NULL;
+END
+$$;
+'''
+
+
+class Migration(migrations.Migration):
+    """Поиск рецептов по имеющимся ингредиентам.
+
+    Массив id ингредиентов рецепта с GIN-индексом служит обратным
+    индексом ингредиент -> рецепты и поддерживается теми же триггерами,
+    что и поисковый вектор.
+    """
+
+    dependencies = [
+        ('recipes', '0010_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), default=list, editable=False, size=None, verbose_name='Ингредиенты'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['ingredient_ids'], name='recipe_ingredient_ids_idx'),
+        ),
+        migrations.RunSQL(
+            sql=INGREDIENT_IDS_FUNCTION,
+            reverse_sql='DROP FUNCTION recipes_recipe_ingredient_ids(bigint);',
+        ),
+        migrations.RunSQL(
+            sql=TRIGGER_FUNCTIONS,
+            reverse_sql=PREVIOUS_TRIGGER_FUNCTIONS,
+        ),
+        migrations.RunSQL(
+            sql=(
+                'UPDATE recipes_recipe SET ingredient_ids = '
+                'recipes_recipe_ingredient_ids(id);'
+            ),
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 3.2 on 2026-10-18 03:00
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_recipe_ingredients(apps, schema_editor):
+    """Объединяет повторяющиеся ингредиенты рецепта в одну строку.
+
+    Количество складывается, как его и суммировал список покупок,
+    поэтому корзины пересчитывать не нужно.
+    """
+    RecipeIngredients = apps.get_model('recipes', 'RecipeIngredients')
+    duplicates = (
+        RecipeIngredients.objects.values('recipe', 'ingredient')
+        .annotate(kept_id=Min('id'), total=Count('id'), amount=Sum('amount'))
+        .filter(total__gt=1)
+        .order_by()
+    )
+    for duplicate in duplicates:
+        RecipeIngredients.objects.filter(
+            recipe=duplicate['recipe'], ingredient=duplicate['ingredient']
+        ).exclude(pk=duplicate['kept_id']).delete()
+        RecipeIngredients.objects.filter(pk=duplicate['kept_id']).update(
+            amount=duplicate['amount']
+        )
+
+
+def remove_duplicate_carts(apps, schema_editor):
+    """Удаляет повторные добавления рецепта в корзину и пересчитывает
+    суммарные количества ингредиентов у затронутых пользователей."""
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    RecipeIngredients = apps.get_model('recipes', 'RecipeIngredients')
+    ShoppingCartIngredient = apps.get_model(
+        'recipes', 'ShoppingCartIngredient'
+    )
+    duplicates = (
+        ShoppingCart.objects.values('user', 'recipe')
+        .annotate(kept_id=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+        .order_by()
+    )
+    users = set()
+    for duplicate in duplicates:
+        ShoppingCart.objects.filter(
+            user=duplicate['user'], recipe=duplicate['recipe']
+        ).exclude(pk=duplicate['kept_id']).delete()
+        users.add(duplicate['user'])
+    if not users:
+        return
+    ShoppingCartIngredient.objects.filter(user__in=users).delete()
+    totals = (
+        RecipeIngredients.objects.filter(recipe__in_carts__user__in=users)
+        .values('recipe__in_carts__user', 'ingredient')
+        .annotate(total=Sum('amount'))
+        .order_by()
+    )
+    ShoppingCartIngredient.objects.bulk_create(
+        (
+            ShoppingCartIngredient(
+                user_id=row['recipe__in_carts__user'],
+                ingredient_id=row['ingredient'],
+                amount=row['total'],
+            )
+            for row in totals
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_ingredient_ids'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_recipe_ingredients, migrations.RunPython.noop
+        ),
+        migrations.RunPython(
+            remove_duplicate_carts, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='recipeingredients',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredient'), include=('amount',), name='unique recipe ingredient'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcart',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique shopping cart'),
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
 from colorfield.fields import ColorField
 
@@ -45,6 +48,11 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique ingredient'),
+        )
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}'
@@ -93,11 +101,66 @@ class Recipe(models.Model):
         auto_now_add=True,
         editable=False,
     )
+    updated_at = models.DateTimeField(
+        verbose_name="Дата изменения",
+        auto_now=True,
+    )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name="В избранном",
+        default=0,
+        editable=False,
+    )
+    trending_score = models.FloatField(
+        verbose_name="Рейтинг популярности за последнее время",
+        default=0,
+        editable=False,
+    )
+    # Заполняется триггером в БД из названия, ингредиентов и описания
+    search_vector = SearchVectorField(
+        verbose_name="Поисковый вектор",
+        null=True,
+        editable=False,
+    )
+    # Заполняется тем же триггером: id ингредиентов рецепта для поиска
+    # рецептов по имеющимся ингредиентам
+    ingredient_ids = ArrayField(
+        models.BigIntegerField(),
+        verbose_name="Ингредиенты",
+        default=list,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ("-pub_date",)
+        indexes = (
+            models.Index(
+                fields=("-pub_date", "-id"),
+                name="recipe_pub_date_id_idx",
+            ),
+            # Последние рецепты автора в подписках
+            models.Index(
+                fields=("author", "-pub_date", "-id"),
+                name="recipe_author_pub_date_idx",
+            ),
+            models.Index(
+                fields=("-favorites_count", "-pub_date", "-id"),
+                name="recipe_popular_idx",
+            ),
+            models.Index(
+                fields=("-trending_score", "-pub_date", "-id"),
+                name="recipe_trending_idx",
+            ),
+            GinIndex(
+                fields=("search_vector",),
+                name="recipe_search_vector_idx",
+            ),
+            GinIndex(
+                fields=("ingredient_ids",),
+                name="recipe_ingredient_ids_idx",
+            ),
+        )
 
     def __str__(self):
         return self.name
@@ -120,6 +183,14 @@ class RecipeIngredients(models.Model):
     class Meta:
         verbose_name = 'Ингредиенты рецепта'
         verbose_name_plural = 'Ингредиенты рецепта'
+        constraints = (
+            # amount в индексе позволяет читать состав рецептов
+            # при изменении корзин только из индекса
+            models.UniqueConstraint(
+                fields=('recipe', 'ingredient'),
+                include=('amount',),
+                name='unique recipe ingredient'),
+        )
 
     def __str__(self) -> str:
         return f"{self.amount} {self.ingredient}"
@@ -137,6 +208,11 @@ class FavoriteRecipe(models.Model):
         on_delete=models.CASCADE,
         related_name='in_favorites'
     )
+    created = models.DateTimeField(
+        verbose_name='Дата добавления',
+        auto_now_add=True,
+        db_index=True,
+    )
 
     class Meta:
         verbose_name = 'Избранный рецепт'
@@ -163,10 +239,51 @@ class ShoppingCart(models.Model):
         on_delete=models.CASCADE,
         related_name='in_carts'
     )
+    created = models.DateTimeField(
+        verbose_name='Дата добавления',
+        auto_now_add=True,
+        db_index=True,
+    )
 
     class Meta:
         verbose_name = 'Корзина покупок'
         verbose_name_plural = 'Корзина покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique shopping cart'),
+        )
 
     def __str__(self):
         return f'{self.user.username} - {self.recipe.name}'
+
+
+class ShoppingCartIngredient(models.Model):
+    """Суммарное количество ингредиентов в корзине пользователя.
+
+    Денормализованная таблица: обновляется при изменении корзины
+    и ингредиентов рецептов, чтобы список покупок читался без агрегации.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='cart_ingredients'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='in_carts'
+    )
+    amount = models.IntegerField()
+
+    class Meta:
+        verbose_name = 'Ингредиент в корзине'
+        verbose_name_plural = 'Ингредиенты в корзине'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique cart ingredient'),
+        )
+
+    def __str__(self):
+        return f'{self.user.username} - {self.amount} {self.ingredient}'
@@ -0,0 +1,24 @@
+from django.db import transaction
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+
+from recipes.images import schedule_variants
+from recipes.models import Recipe
+
+
+@receiver(pre_save, sender=Recipe)
+def detect_new_image(instance, **kwargs):
+    """Отметить рецепт, которому загрузили новое изображение: файл ещё
+    не записан в хранилище до сохранения модели."""
+    instance.image_uploaded = (
+        bool(instance.image) and not instance.image._committed
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def generate_image_variants(instance, **kwargs):
+    """Создать варианты нового изображения после фиксации транзакции,
+    как из API, так и из админки."""
+    if getattr(instance, 'image_uploaded', False):
+        name = instance.image.name
+        transaction.on_commit(lambda: schedule_variants(name))
@@ -18,6 +18,16 @@ class User(AbstractUser):
         _('last name'),
         max_length=Constans.LENGTH_CHAR_FIELD_100
     )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'Пользователь'